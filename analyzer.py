@@ -8,12 +8,159 @@
 # December 15, 2016
 #
 
+import string
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from classical_ciphers import text_to_codes
+
+# Both cases of every ASCII letter -> 0 ~ 25
+LETTER_INDEX = {c: i % 26 for i, c in enumerate(string.ascii_lowercase + string.ascii_uppercase)}
+
+# Relative frequency of each letter (a ~ z) in English text
+ENGLISH_FREQUENCIES = [
+    0.08167, 0.01492, 0.02782, 0.04253, 0.12702, 0.02228, 0.02015, 0.06094, 0.06966, 0.00153,
+    0.00772, 0.04025, 0.02406, 0.06749, 0.07507, 0.01929, 0.00095, 0.05987, 0.06327, 0.09056,
+    0.02758, 0.00978, 0.02360, 0.00150, 0.01974, 0.00074,
+]
+
+
+def letter_indices(text):
+    """
+    Converts the letters of the text to 0 ~ 25, case folded, skipping everything else.
+    :return: Array (list without NumPy) of letter indices
+    """
+    if np is not None:
+        codes, _ = text_to_codes(text)
+        # Setting bit 5 folds upper case onto lower case; codes below 'a' wrap around in the subtraction
+        folded = (codes | 32) - codes.dtype.type(97)
+        return folded[folded < 26].astype(np.int64)
+    return [LETTER_INDEX[c] for c in text if c in LETTER_INDEX]
+
+
+def count_ngrams(indices, n):
+    """
+    Counts the n-grams of the letter indices.
+    :return: Flat array of 26 ** n counts, where the n-gram (a, b, c) is at a * 676 + b * 26 + c
+    """
+    size = 26 ** n
+    if np is not None:
+        if len(indices) < n:
+            return np.zeros(size, dtype=np.int64)
+        combined = indices[:len(indices) - n + 1].copy()
+        for offset in range(1, n):
+            combined *= 26
+            combined += indices[offset:len(indices) - n + 1 + offset]
+        return np.bincount(combined, minlength=size)
+
+    counts = [0] * size
+    combined = Counter(zip(*(indices[offset:] for offset in range(n))))
+    for gram, count in combined.items():
+        position = 0
+        for letter in gram:
+            position = position * 26 + letter
+        counts[position] = count
+    return counts
+
+
+def letter_histogram(text):
+    """
+    :return: Array of the 26 letter counts of the text, case folded
+    """
+    return count_ngrams(letter_indices(text), 1)
+
+
+def add_counts(counts1, counts2):
+    """
+    :return: New array of the element-wise sums of two count arrays
+    """
+    if np is not None:
+        return counts1 + counts2
+    return [a + b for a, b in zip(counts1, counts2)]
+
+
+class TextStats:
+    """
+    Letter statistics of a text, stored as flat count arrays instead of dictionaries.
+        unigrams: 26 letter counts
+        bigrams: 26 ** 2 pair counts, (a, b) at a * 26 + b
+        trigrams: 26 ** 3 triple counts, (a, b, c) at a * 676 + b * 26 + c
+        letters, non_letters: How many characters were and were not letters
+    N-grams are counted over the letters only, with case ignored, so "A b" contains the bigram "ab".
+    Stats of consecutive chunks can be merged; the first and last two letters of each chunk are kept so that
+    the n-grams spanning the boundary are counted too.
+    """
+
+    def __init__(self, unigrams, bigrams, trigrams, letters, non_letters, head, tail):
+        self.unigrams = unigrams
+        self.bigrams = bigrams
+        self.trigrams = trigrams
+        self.letters = letters
+        self.non_letters = non_letters
+        self.head = head
+        self.tail = tail
+
+    @classmethod
+    def from_text(cls, text):
+        """
+        Computes the statistics of the text in one pass over its encoded letters.
+        """
+        indices = letter_indices(text)
+        return cls(count_ngrams(indices, 1), count_ngrams(indices, 2), count_ngrams(indices, 3),
+                   len(indices), len(text) - len(indices),
+                   [int(i) for i in indices[:2]], [int(i) for i in indices[-2:]])
+
+    def merge(self, other):
+        """
+        Combines the stats of this text with those of the text that directly follows it.
+        :return: New TextStats for the two texts joined together
+        """
+        unigrams = add_counts(self.unigrams, other.unigrams)
+        bigrams = add_counts(self.bigrams, other.bigrams)
+        trigrams = add_counts(self.trigrams, other.trigrams)
+
+        # Count the n-grams that start in this text and end in the other
+        joint = self.tail + other.head
+        for n, counts in ((2, bigrams), (3, trigrams)):
+            for start in range(len(joint) - n + 1):
+                if start < len(self.tail) < start + n:
+                    position = 0
+                    for letter in joint[start:start + n]:
+                        position = position * 26 + letter
+                    counts[position] += 1
+
+        return TextStats(unigrams, bigrams, trigrams,
+                         self.letters + other.letters, self.non_letters + other.non_letters,
+                         (self.head + other.head)[:2], (self.tail + other.tail)[-2:])
+
+    def index_of_coincidence(self):
+        """
+        The chance that two letters picked at random from the text are the same.
+        Around 0.066 for English, and 0.038 for uniformly random letters.
+        """
+        if self.letters < 2:
+            return 0.0
+        return float(sum(int(n) * (int(n) - 1) for n in self.unigrams)) / (self.letters * (self.letters - 1))
+
+    def letter_ratio(self):
+        """
+        :return: The fraction of characters that are letters
+        """
+        total = self.letters + self.non_letters
+        return self.letters / total if total else 0.0
+
 
 class Analyzer:
     """
     Analyzer class
     Currently capable of:
         Counting letter frequency
+        Counting unigrams, bigrams and trigrams, the index of coincidence and the ratio of letters,
+        on whole texts or chunk by chunk
     """
     def __init__(self):
         self.text = ""
@@ -27,13 +174,29 @@ class Analyzer:
         :return:
         """
         self.letter_dict.clear()
-        for letter in text:
-            if letter in self.letter_dict.keys():
-                self.letter_dict[letter] += 1
-            else:
-                self.letter_dict[letter] = 1
+        self.letter_dict.update(Counter(text))
         print(self.letter_dict)
 
+    def analyze(self, text):
+        """
+        :return: TextStats of the text
+        """
+        return TextStats.from_text(text)
+
+    def analyze_chunks(self, chunks):
+        """
+        Analyzes a text given as an iterable of chunks, eg. from cipher.read_chunks, so that only one chunk
+        is in memory at a time.
+        :return: TextStats of the whole text
+        """
+        stats = TextStats.from_text("")
+        for chunk in chunks:
+            stats = stats.merge(TextStats.from_text(chunk))
+        return stats
+
+
 if __name__ == "__main__":
     a = Analyzer()
-    a.letter_count("SHION FUKUZAWA")
\ No newline at end of file
+    a.letter_count("SHION FUKUZAWA")
+    s = a.analyze_chunks(["Shion Fu", "kuzawa"])
+    print(s.letters, s.index_of_coincidence(), s.letter_ratio())
@@ -0,0 +1,449 @@
+#
+# CS106 Final Project
+# CryptWing
+#
+# benchmarks
+#
+# Shion Fukuzawa (sf27)
+# December 15, 2016
+#
+# This file measures the throughput of the ciphers on large synthetic inputs.
+#
+# Usage:
+#   python3 benchmark.py                      caesar and Viginere engines against the per-character paths
+#   python3 benchmark.py bulk [size in MB]    memory mapped bulk mode
+#   python3 benchmark.py parallel [size in MB]
+#   python3 benchmark.py suite [-h]           every cipher and the analyzer over a sweep of sizes, key
+#                                             lengths and letter mixes, checked against a baseline
+#
+
+import argparse
+import json
+import os
+import platform
+import random
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from concurrent.futures import ProcessPoolExecutor
+
+from analyzer import Analyzer
+from bulk import bulk_encrypt_file, bulk_decrypt_file
+from classical_ciphers import CaesarCipher, ViginereCipher, PlayfairCipher, TranspositionCipher, \
+    ColumnarTranspositionCipher
+from parallel import parallel_encrypt
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Results of an earlier suite run on this machine, which later runs are compared with (not kept in git,
+# since throughput depends on the machine)
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "benchmark_baseline.json")
+
+KB = 1 << 10
+MB = 1 << 20
+
+# Input sizes of the size sweep
+SUITE_SIZES = (KB, 10 * KB, 100 * KB, MB, 10 * MB, 100 * MB)
+
+# Size of the inputs of the key length and letter mix sweeps
+SWEEP_SIZE = MB
+
+# Share of letters in the text of each letter mix. The rest are spaces, digits and punctuation.
+LETTER_MIXES = {
+    'letters': 1.0,
+    'prose': 0.8,
+    'noisy': 0.5,
+}
+
+# Cipher name -> (cipher class, default key, key lengths of the key length sweep). A cipher without key
+# lengths does not use its key.
+SUITE_CIPHERS = {
+    'caesar': (CaesarCipher, 17, ()),
+    'viginere': (ViginereCipher, "mindblown", (3, 16, 256)),
+    'playfair': (PlayfairCipher, "monarchy", (4, 25)),
+    'transposition': (TranspositionCipher, None, ()),
+    'columnar': (ColumnarTranspositionCipher, "zebras", (5, 32, 256)),
+}
+
+# Cases up to SWEEP_SIZE are run again and again until this many seconds have passed, and the best time is
+# kept. Many of them take well under a millisecond, so a few runs would leave them at the mercy of noise.
+MIN_TIME = 0.2
+
+# Cases that took less than this many seconds a run in the baseline are left out of the speed check; even the
+# best of many runs still moves by more than the tolerance from one process to the next
+MIN_COMPARED_SECONDS = 1e-3
+
+# A case regresses when it is this much slower, or uses this much more memory, than in the baseline
+TOLERANCE = 0.25
+
+
+def make_text(size, seed=0):
+    """
+    Generates a reproducible text of mixed case letters, spaces and punctuation.
+    :param size: Number of characters to generate
+    :return: The generated text
+    """
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + "     .,!?'0123456789"
+    return "".join(rng.choice(alphabet) for _ in range(size))
+
+
+def time_call(func, *args, repeat=3, min_time=0.0):
+    """
+    Runs func(*args) [repeat] times, and then more until min_time seconds have passed in total.
+    :return: The best wall time in seconds, and the result of the last call
+    """
+    best = None
+    result = None
+    runs = 0
+    total = 0.0
+    while runs < repeat or total < min_time:
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+        runs += 1
+        total += elapsed
+    return best, result
+
+
+def caesar_per_char(text, key):
+    """
+    The original caesar encryption path, which shifts and appends one character at a time.
+    Kept as the reference for the table driven engine.
+    """
+    caesar = CaesarCipher()
+    cipher_text = ""
+    for c in text:
+        cipher_text += caesar.shift_char(c, key)
+    return cipher_text
+
+
+def bench_caesar(size, key=17):
+    """
+    Compares the per-character caesar path against the translation table engine.
+    :return: (per_char_mb_s, table_mb_s)
+    """
+    text = make_text(size)
+    mb = size / MB
+    per_char_time, expected = time_call(caesar_per_char, text, key, repeat=1)
+    table_time, result = time_call(CaesarCipher().encrypt, text, key)
+    if result != expected:
+        raise AssertionError("Table driven caesar output differs from the per-character path")
+    return mb / per_char_time, mb / table_time
+
+
+def vigenere_per_char(text, key):
+    """
+    The original Viginere encryption path, which runs the caesar cipher on one character at a time.
+    Kept as the reference for the vectorized engine.
+    """
+    vigenere = ViginereCipher()
+    key_list = vigenere.key_to_int(key)
+    cipher_text = ""
+    for i in range(len(text)):
+        cipher_text += vigenere.caesar.encrypt(text[i], key_list[i % len(key_list)])
+    return cipher_text
+
+
+def bench_vigenere(size, key="mindblown"):
+    """
+    Compares the per-character Viginere path against the vectorized engine.
+    :return: (per_char_mb_s, engine_mb_s)
+    """
+    text = make_text(size)
+    mb = size / MB
+    per_char_time, expected = time_call(vigenere_per_char, text, key, repeat=1)
+    engine_time, result = time_call(ViginereCipher().encrypt, text, key)
+    if result != expected:
+        raise AssertionError("Vectorized Viginere output differs from the per-character path")
+    return mb / per_char_time, mb / engine_time
+
+
+def make_file(path, size, block_size=1 << 20):
+    """
+    Writes [size] bytes of ASCII text to path, repeating one generated block.
+    """
+    block = make_text(block_size).encode('ascii')
+    with open(path, 'wb') as tfile:
+        for start in range(0, size, block_size):
+            tfile.write(block[:size - start])
+
+
+def bench_bulk(size=1 << 30):
+    """
+    Encrypts and decrypts a file of [size] bytes (1 GB by default) with the memory mapped bulk mode,
+    checking that the round trip gives back the original file.
+    :return: Dictionary of cipher name -> (encrypt MB/s, decrypt MB/s)
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        plain_path = os.path.join(directory, "plain.txt")
+        cipher_path = os.path.join(directory, "cipher.txt")
+        round_trip_path = os.path.join(directory, "round_trip.txt")
+        make_file(plain_path, size)
+
+        for cipher, key in ((CaesarCipher(), 17), (ViginereCipher(), "mindblown")):
+            encrypt_time, _ = time_call(bulk_encrypt_file, cipher, plain_path, cipher_path, key, repeat=1)
+            decrypt_time, _ = time_call(bulk_decrypt_file, cipher, cipher_path, round_trip_path, key, repeat=1)
+            if not files_equal(plain_path, round_trip_path):
+                raise AssertionError("Bulk %s round trip does not match the input" % type(cipher).__name__)
+            results[type(cipher).__name__] = (size / MB / encrypt_time, size / MB / decrypt_time)
+    return results
+
+
+def files_equal(path1, path2, block_size=1 << 24):
+    """
+    Compares two files block by block.
+    """
+    with open(path1, 'rb') as file1, open(path2, 'rb') as file2:
+        while True:
+            block1 = file1.read(block_size)
+            if block1 != file2.read(block_size):
+                return False
+            if not block1:
+                return True
+
+
+def bench_parallel(size, worker_counts=(1, 2, 4, 8)):
+    """
+    Encrypts one text of [size] characters in parallel mode with each number of workers, checking
+    that the output is identical to the serial path.
+    :return: Dictionary of cipher name -> list of (workers, MB/s), with workers 0 meaning serial
+    """
+    text = make_text(size)
+    results = {}
+    for cipher, key in ((CaesarCipher(), 17), (ViginereCipher(), "mindblown"), (PlayfairCipher(), "monarchy")):
+        serial_time, expected = time_call(cipher.encrypt, text, key, repeat=1)
+        speeds = [(0, size / MB / serial_time)]
+        for workers in worker_counts:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                parallel_time, result = time_call(parallel_encrypt, cipher, text, key, workers, executor, repeat=1)
+            if result != expected:
+                raise AssertionError("Parallel %s output differs from the serial path" % type(cipher).__name__)
+            speeds.append((workers, size / MB / parallel_time))
+        results[type(cipher).__name__] = speeds
+    return results
+
+
+def make_mixed_text(size, letters=0.8, seed=0, block_size=MB):
+    """
+    Generates a reproducible text in which about [letters] of the characters are letters. Texts longer than
+    block_size repeat one generated block, so a 100 MB input does not take minutes to make.
+    :param size: Number of characters to generate
+    :param letters: Share of letters, 0 ~ 1
+    :return: The generated text
+    """
+    rng = random.Random(seed)
+    others = " .,!?'0123456789\n"
+    weights = [letters / len(string.ascii_letters)] * len(string.ascii_letters) + \
+              [(1 - letters) / len(others)] * len(others)
+    block = "".join(rng.choices(string.ascii_letters + others, weights=weights, k=min(size, block_size)))
+    return (block * (size // len(block) + 1))[:size]
+
+
+def make_key(length, seed=0):
+    """
+    :return: A reproducible key of [length] lower case letters
+    """
+    rng = random.Random(seed)
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def peak_memory(func, *args):
+    """
+    Runs func(*args) once under tracemalloc (which also sees NumPy's buffers).
+    :return: The most memory the call held at once, in bytes, not counting what was allocated before it
+    """
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def measure(func, data, key, repeat, min_time=0.0):
+    """
+    Times func(data, key), then measures its peak memory in a separate call, since tracemalloc slows
+    every allocation down.
+    :param data: The input the case works on. Its length is the size the throughput is worked out from.
+    :return: Dictionary of the case result
+    """
+    seconds, _ = time_call(func, data, key, repeat=repeat, min_time=min_time)
+    return {
+        'size': len(data),
+        'seconds': seconds,
+        'mb_s': len(data) / MB / seconds if seconds else float('inf'),
+        'peak_mb': peak_memory(func, data, key) / MB,
+    }
+
+
+def suite_cases(max_size=SUITE_SIZES[-1], ciphers=None):
+    """
+    Lists the benchmark cases:
+        size sweep: every cipher with its default key on prose, at every size up to max_size
+        key sweep: ciphers that use a key, at each key length, on prose of SWEEP_SIZE characters
+        mix sweep: every cipher with its default key on each letter mix, of SWEEP_SIZE characters
+    The analyzer gets the size and mix sweeps as well.
+    :param ciphers: Names in SUITE_CIPHERS to run, or None for all of them
+    :return: List of (case name, name, key, letter mix, size), each name unique
+    """
+    names = sorted(SUITE_CIPHERS) if ciphers is None else ciphers
+    sizes = [size for size in SUITE_SIZES if size <= max_size]
+    sweep_size = min(SWEEP_SIZE, max_size)
+    cases = []
+    for name in names + ['analyzer']:
+        _, key, key_lengths = SUITE_CIPHERS.get(name, (None, None, ()))
+        for size in sizes:
+            cases.append(("%s/size/%d" % (name, size), name, key, 'prose', size))
+        for length in key_lengths:
+            cases.append(("%s/key/%d" % (name, length), name, make_key(length), 'prose', sweep_size))
+        for mix in sorted(LETTER_MIXES):
+            cases.append(("%s/mix/%s" % (name, mix), name, key, mix, sweep_size))
+    return cases
+
+
+def run_suite(max_size=SUITE_SIZES[-1], ciphers=None, out=sys.stdout):
+    """
+    Runs every case of suite_cases. Ciphers are timed on encrypt and decrypt (of their own cipher text, whose
+    length is the decrypt size), the analyzer on analyze.
+    Inputs up to SWEEP_SIZE are timed at least 3 times and for MIN_TIME seconds, and the best time kept;
+    larger inputs once.
+    :return: Dictionary of 'machine' (what the numbers were measured on) and 'results' (case name ->
+             dictionary of size, seconds, mb_s and peak_mb)
+    """
+    results = {}
+    texts = {}
+    for case, name, key, mix, size in suite_cases(max_size, ciphers):
+        if (mix, size) not in texts:
+            texts.clear()  # Keep one input at a time, so a 100 MB text does not stay around
+            texts[(mix, size)] = make_mixed_text(size, LETTER_MIXES[mix])
+        text = texts[(mix, size)]
+        repeat, min_time = (3, MIN_TIME) if size <= SWEEP_SIZE else (1, 0.0)
+
+        if name == 'analyzer':
+            analyzer = Analyzer()
+            methods = (('analyze', lambda text, key: analyzer.analyze(text), text),)
+        else:
+            cipher = SUITE_CIPHERS[name][0]()
+            methods = (('encrypt', cipher.encrypt, text), ('decrypt', cipher.decrypt, cipher.encrypt(text, key)))
+
+        for method, func, data in methods:
+            result = measure(func, data, key, repeat, min_time)
+            results["%s/%s" % (case, method)] = result
+            print("%-32s %-8s %9.2f MB/s %9.2f MB peak" % (case, method, result['mb_s'], result['peak_mb']),
+                  file=out)
+    return {'machine': machine_info(), 'results': results}
+
+
+def machine_info():
+    """
+    :return: Dictionary describing what the suite ran on, saved with the results
+    """
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__ if np is not None else None,
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Compares the cases that are in both runs with the same input size. The speed of cases faster than
+    MIN_COMPARED_SECONDS is not compared.
+    :param results: Output of run_suite
+    :param baseline: Output of an earlier run_suite
+    :return: List of messages, one per case that got slower or bigger than the tolerance allows
+    """
+    regressions = []
+    old_results = baseline.get('results', {})
+    for case, new in sorted(results['results'].items()):
+        old = old_results.get(case)
+        if old is None or old['size'] != new['size']:  # Sweeps shrink with --max-size
+            continue
+        if old['seconds'] >= MIN_COMPARED_SECONDS and new['mb_s'] < old['mb_s'] * (1 - tolerance):
+            regressions.append("%s: %.2f MB/s, was %.2f MB/s" % (case, new['mb_s'], old['mb_s']))
+        # Memory is only compared above 1 MB, below which tracemalloc mostly sees interpreter noise
+        if new['peak_mb'] > max(old['peak_mb'] * (1 + tolerance), 1.0):
+            regressions.append("%s: %.2f MB peak, was %.2f MB" % (case, new['peak_mb'], old['peak_mb']))
+    return regressions
+
+
+def suite_main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmark.py suite",
+                                      description="Benchmark every cipher and the analyzer, and check the "
+                                                  "results against a baseline.")
+    parser.add_argument("--max-size", type=float, default=SUITE_SIZES[-1] / MB,
+                        help="largest input of the size sweep, in MB (default %(default)g)")
+    parser.add_argument("--cipher", action="append", choices=sorted(SUITE_CIPHERS),
+                        help="cipher to run (repeatable, default all)")
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE, help="JSON results to compare with (default %(default)s)")
+    parser.add_argument("--update-baseline", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="allowed slowdown or memory growth, as a fraction (default %(default)g)")
+    args = parser.parse_args(argv)
+
+    results = run_suite(int(args.max_size * MB), args.cipher)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print("Saved the baseline to %s" % args.baseline)
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline at %s, run with --update-baseline to save one" % args.baseline)
+        return 0
+
+    with open(args.baseline) as file:
+        regressions = compare(results, json.load(file), args.tolerance)
+    for message in regressions:
+        print("REGRESSION " + message)
+    if regressions:
+        return 1
+    print("No regressions against %s" % args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "suite":
+        sys.exit(suite_main(sys.argv[2:]))
+
+    if len(sys.argv) > 1 and sys.argv[1] == "parallel":
+        # python3 benchmark.py parallel [size in MB]
+        size_mb = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+        for name, speeds in bench_parallel(size_mb * MB).items():
+            print("PARALLEL %s %d MB: " % (name, size_mb) + ", ".join(
+                "%s %.2f MB/s" % ("serial" if workers == 0 else "%d workers" % workers, speed)
+                for workers, speed in speeds))
+        sys.exit()
+
+    if len(sys.argv) > 1 and sys.argv[1] == "bulk":
+        # python3 benchmark.py bulk [size in MB]
+        size_mb = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+        for name, (encrypt_speed, decrypt_speed) in bench_bulk(size_mb * MB).items():
+            print("BULK %s %d MB: encrypt %8.2f MB/s, decrypt %8.2f MB/s"
+                  % (name, size_mb, encrypt_speed, decrypt_speed))
+        sys.exit()
+
+    for size in (10 ** 4, 10 ** 5, 10 ** 6):
+        per_char, table = bench_caesar(size)
+        print("CAESAR %9d chars: per-char %8.2f MB/s, table %8.2f MB/s (x%.0f)"
+              % (size, per_char, table, table / per_char))
+    for size in (10 ** 4, 10 ** 5, 10 ** 6):
+        per_char, engine = bench_vigenere(size)
+        print("VIGINERE %7d chars: per-char %8.2f MB/s, engine %8.2f MB/s (x%.0f)"
+              % (size, per_char, engine, engine / per_char))
@@ -0,0 +1,71 @@
+#
+# CS106 Final Project
+# CryptWing
+#
+# bulk file mode
+#
+# Shion Fukuzawa (sf27)
+# December 15, 2016
+#
+# This file runs ciphers directly over memory mapped files, for inputs too large to read into a string.
+#
+
+import mmap
+import os
+
+from classical_ciphers import CaesarCipher, ViginereCipher
+
+# Number of bytes handed to the cipher at a time
+BULK_CHUNK_SIZE = 1 << 24
+
+# Ciphers whose output is exactly as long as their input, so the output file can be allocated up front
+BULK_CIPHERS = (CaesarCipher, ViginereCipher)
+
+
+def bulk_process(cipher, in_path, out_path, key=None, decrypt=False, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Runs the cipher over the file at in_path and writes the result to out_path.
+    Both files are memory mapped, the output is allocated to its final size before any work is done,
+    and the cipher sees the input as bytes, so no str copies of the data are ever made.
+    The output matches the str methods for ASCII files.
+    :param cipher: A CaesarCipher or ViginereCipher
+    :param decrypt: Decrypts if True, encrypts otherwise
+    :return: The number of bytes processed
+    """
+    if not isinstance(cipher, BULK_CIPHERS):
+        raise TypeError("Bulk mode only supports the caesar and Viginere ciphers.")
+
+    if decrypt:
+        stream = cipher.stream_decryptor(key)
+    else:
+        stream = cipher.stream_encryptor(key)
+
+    size = os.path.getsize(in_path)
+    with open(in_path, 'rb') as in_file, open(out_path, 'w+b') as out_file:
+        out_file.truncate(size)
+        if size == 0:  # Empty files cannot be mapped
+            return 0
+
+        with mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ) as source, \
+                mmap.mmap(out_file.fileno(), size) as target:
+            for start in range(0, size, chunk_size):
+                end = min(start + chunk_size, size)
+                target[start:end] = stream.update(source[start:end])
+            target.flush()
+    return size
+
+
+def bulk_encrypt_file(cipher, in_path, out_path, key=None, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Encrypts the file at in_path into out_path in bulk mode.
+    :return: The number of bytes processed
+    """
+    return bulk_process(cipher, in_path, out_path, key, decrypt=False, chunk_size=chunk_size)
+
+
+def bulk_decrypt_file(cipher, in_path, out_path, key=None, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Decrypts the file at in_path into out_path in bulk mode.
+    :return: The number of bytes processed
+    """
+    return bulk_process(cipher, in_path, out_path, key, decrypt=True, chunk_size=chunk_size)
@@ -13,11 +13,137 @@
 #    http://practicalcryptography.com/
 #
 
+import os
+import tempfile
+
+from instrumentation import INSTRUMENTATION
+from key_cache import KEY_SCHEDULES
+from result_cache import RESULTS
+
+# Number of characters read or written at a time by the streaming methods
+CHUNK_SIZE = 1 << 16
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """
+    Reads a text file a chunk at a time, so the whole file never has to be in memory.
+    :return: Generator of strings of at most chunk_size characters
+    """
+    with open(path) as tfile:
+        while True:
+            chunk = tfile.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def write_chunks(path, chunks):
+    """
+    Writes every chunk to the file at path, replacing its contents.
+    The chunks go to a temporary file next to it first, so if they stop with an error, nothing is left at
+    path (and a file that was there before is kept).
+    """
+    temporary = "%s.%d.tmp" % (path, os.getpid())
+    try:
+        with open(temporary, 'w') as tfile:
+            for chunk in chunks:
+                tfile.write(chunk)
+        os.replace(temporary, path)
+    except BaseException:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        raise
+
+
+def run_stream(stream, chunks):
+    """
+    Feeds every chunk to the stream, then finishes it.
+    :param stream: Object with update(chunk) -> str and finish() -> iterable of str
+    :return: Generator of the non-empty output chunks
+    """
+    for chunk in chunks:
+        out = stream.update(chunk)
+        if out:
+            yield out
+    for out in stream.finish():
+        if out:
+            yield out
+
+
+def pack_texts(texts):
+    """
+    Concatenates a batch of texts, so they can be processed in a single pass.
+    :return: (the concatenated text, offsets), where text i is buffer[offsets[i]:offsets[i + 1]]
+    """
+    offsets = [0]
+    for text in texts:
+        offsets.append(offsets[-1] + len(text))
+    return "".join(texts), offsets
+
+
+def unpack_texts(buffer, offsets):
+    """
+    Splits a buffer made by pack_texts (or one processed without changing its length) back into texts.
+    :return: List of the texts
+    """
+    return [buffer[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+
+class BufferedStream:
+    """
+    Stream for ciphers that cannot carry their state from one chunk to the next.
+    Collects every chunk and runs the whole-text method when the input ends, so its memory use is not bounded.
+    """
+
+    def __init__(self, method, key):
+        self.method = method
+        self.key = key
+        self.chunks = []
+
+    def update(self, chunk):
+        self.chunks.append(chunk)
+        return ""
+
+    def finish(self):
+        yield self.method("".join(self.chunks), self.key)
+
+
+class CharSpool:
+    """
+    A temporary file of characters that can be read back from any character offset.
+    Used by streams that have to hold on to more text than should be kept in memory.
+    """
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.length = 0
+
+    def write(self, text):
+        # utf-32 gives every character 4 bytes, so character offsets map directly to file offsets
+        self.file.write(text.encode('utf-32-le'))
+        self.length += len(text)
+
+    def read(self, start, count):
+        """
+        :return: Up to count characters, starting at character offset start
+        """
+        self.file.seek(start * 4)
+        return self.file.read(count * 4).decode('utf-32-le')
+
+    def close(self):
+        self.file.close()
+
+
 class Cipher:
     """
     Cipher base class.
     Implements the main constructor, string method,
     and empty encrypt/decrypt methods.
+    Also implements the streaming methods, which run a cipher over an iterable of chunks. Subclasses
+    carry their state across chunk boundaries by overriding stream_encryptor/stream_decryptor.
+    Every subclass is registered with INSTRUMENTATION, so INSTRUMENTATION.enable() counts its calls too.
     """
 
     def __init__(self):
@@ -26,6 +152,35 @@ class Cipher:
         """
         pass
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        INSTRUMENTATION.register(cls)
+
+    @classmethod
+    def stats(cls):
+        """
+        :return: What INSTRUMENTATION has counted for this cipher class, or for every cipher class when called
+                 on Cipher itself. Empty counters unless INSTRUMENTATION.enable() was called.
+        """
+        if cls is Cipher:
+            return INSTRUMENTATION.stats()
+        return INSTRUMENTATION.stats(cls)
+
+    def key_schedule(self, key):
+        """
+        Returns the key material the cipher needs for this key. Schedules are shared between all
+        instances of a cipher through KEY_SCHEDULES, so each key is only prepared once.
+        """
+        return KEY_SCHEDULES.get(type(self).__name__, key, self.build_key_schedule)
+
+    def build_key_schedule(self, key):
+        """
+        Prepares the key for use. Ciphers with key material worth precomputing override this.
+        :param key: A key (type varies between the cipher)
+        :return: The key schedule
+        """
+        return key
+
     def encrypt(self, text, key=None):
         """
         :param text: A string of the message to encrypt.
@@ -35,6 +190,92 @@ class Cipher:
         print("Encrypting '" + text + "'...")
         pass
 
+    def encrypt_cached(self, text, key=None, cache=None):
+        """
+        encrypt(), answered from the result cache when this text was already encrypted with this key.
+        :param cache: The ResultCache to use, RESULTS by default
+        """
+        return (cache or RESULTS).run(self, 'encrypt', text, key)
+
+    def decrypt_cached(self, text, key=None, cache=None):
+        """
+        decrypt(), answered from the result cache when this text was already decrypted with this key.
+        :param cache: The ResultCache to use, RESULTS by default
+        """
+        return (cache or RESULTS).run(self, 'decrypt', text, key)
+
+    def encrypt_many(self, texts, key=None):
+        """
+        Encrypts a batch of texts with the same key. Ciphers override this to prepare the key once and
+        process the whole batch in one pass.
+        :param texts: List of strings
+        :return: List of the encrypted texts, in the same order
+        """
+        return [self.encrypt(text, key) for text in texts]
+
+    def decrypt_many(self, texts, key=None):
+        """
+        Decrypts a batch of texts with the same key.
+        :param texts: List of strings
+        :return: List of the decrypted texts, in the same order
+        """
+        return [self.decrypt(text, key) for text in texts]
+
+    def encrypt_bytes(self, data, key=None):
+        """
+        Encrypts ASCII bytes, giving the same result as encrypt() on the decoded text.
+        Ciphers override this to work on the bytes directly; this fallback goes through the str methods.
+        :param data: bytes, bytearray, or any object supporting the buffer protocol (memoryview, mmap)
+        :return: The encrypted bytes. An invalid key raises ValueError where the cipher supports it.
+        """
+        return self.encrypt(memoryview(data).tobytes().decode('ascii'), key).encode('ascii')
+
+    def decrypt_bytes(self, data, key=None):
+        """
+        Decrypts ASCII bytes, giving the same result as decrypt() on the decoded text.
+        :param data: bytes, bytearray, or any object supporting the buffer protocol (memoryview, mmap)
+        :return: The decrypted bytes
+        """
+        return self.decrypt(memoryview(data).tobytes().decode('ascii'), key).encode('ascii')
+
+    def stream_encryptor(self, key=None):
+        """
+        :return: Stream object that encrypts one chunk at a time. See run_stream.
+        """
+        return BufferedStream(self.encrypt, key)
+
+    def stream_decryptor(self, key=None):
+        """
+        :return: Stream object that decrypts one chunk at a time. See run_stream.
+        """
+        return BufferedStream(self.decrypt, key)
+
+    def encrypt_stream(self, chunks, key=None):
+        """
+        Encrypts an iterable of text chunks, giving the same text as encrypt() would on the joined chunks.
+        :return: Generator of encrypted chunks
+        """
+        return run_stream(self.stream_encryptor(key), chunks)
+
+    def decrypt_stream(self, chunks, key=None):
+        """
+        Decrypts an iterable of text chunks, giving the same text as decrypt() would on the joined chunks.
+        :return: Generator of decrypted chunks
+        """
+        return run_stream(self.stream_decryptor(key), chunks)
+
+    def encrypt_file(self, in_path, out_path, key=None, chunk_size=CHUNK_SIZE):
+        """
+        Encrypts the file at in_path into out_path without loading either of them into memory.
+        """
+        write_chunks(out_path, self.encrypt_stream(read_chunks(in_path, chunk_size), key))
+
+    def decrypt_file(self, in_path, out_path, key=None, chunk_size=CHUNK_SIZE):
+        """
+        Decrypts the file at in_path into out_path without loading either of them into memory.
+        """
+        write_chunks(out_path, self.decrypt_stream(read_chunks(in_path, chunk_size), key))
+
     def decrypt(self, text, key=None):
         """
         Uses the cipher's decryption method to decrypt the text
@@ -45,6 +286,9 @@ class Cipher:
         print("Decrypting '" + text + "'...")
         pass
 
+
+INSTRUMENTATION.register(Cipher)
+
 if __name__ == "__main__":
     c = Cipher()
     c.encrypt("Hello")
@@ -13,7 +13,212 @@
 #    http://practicalcryptography.com/
 #
 
-from cipher import Cipher
+import string
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from cipher import Cipher, BufferedStream, CharSpool, CHUNK_SIZE, pack_texts, unpack_texts
+
+
+def build_shift_tables():
+    """
+    Builds one str.translate table for every caesar shift (0 ~ 25).
+    Only the ASCII letters are mapped, so every other character passes through unchanged.
+    :return: List of translation tables, indexed by the shift amount
+    """
+    tables = []
+    for shift in range(26):
+        upper = string.ascii_uppercase[shift:] + string.ascii_uppercase[:shift]
+        lower = string.ascii_lowercase[shift:] + string.ascii_lowercase[:shift]
+        tables.append(str.maketrans(string.ascii_uppercase + string.ascii_lowercase, upper + lower))
+    return tables
+
+
+def build_byte_shift_tables():
+    """
+    Same as build_shift_tables, but the tables are for bytes.translate.
+    :return: List of 256 byte translation tables, indexed by the shift amount
+    """
+    letters = (string.ascii_uppercase + string.ascii_lowercase).encode('ascii')
+    tables = []
+    for shift in range(26):
+        shifted = "".join(map(chr, SHIFT_TABLES[shift].values())).encode('ascii')
+        tables.append(bytes.maketrans(letters, shifted))
+    return tables
+
+
+# Built once at import, shared by every cipher that shifts letters.
+SHIFT_TABLES = build_shift_tables()
+BYTE_SHIFT_TABLES = build_byte_shift_tables()
+
+# Every ASCII character str.split() splits on, for dropping whitespace from bytes with one translate call
+WHITESPACE_BYTES = bytes(c for c in range(128) if chr(c).isspace())
+
+
+def as_bytes(data):
+    """
+    :param data: bytes, bytearray, or any other object supporting the buffer protocol (memoryview, mmap)
+    :return: The data as bytes, copied only if it is not bytes already
+    """
+    if isinstance(data, bytes):
+        return data
+    return memoryview(data).tobytes()
+
+
+def vigenere_shift(text, shifts):
+    """
+    Shifts the i-th character of the text by shifts[i % len(shifts)]. Non-letters still use up a
+    position of the key, but are passed through unchanged.
+    Uses NumPy when it is installed, and falls back to one translate call per key position otherwise.
+    :param text: A string, or ASCII bytes (any bytes-like object). Bytes count as one position each.
+    :param shifts: Non-empty list of integer shifts
+    :return: The shifted text, of the same type as the text (bytes for any bytes-like object)
+    """
+    if isinstance(text, str):
+        if np is not None:
+            return _vigenere_shift_numpy(text, shifts)
+        return _vigenere_shift_python(text, shifts)
+
+    if np is not None:
+        return shift_codes(np.frombuffer(text, dtype=np.uint8), shifts).tobytes()
+    return _vigenere_shift_bytes(bytes(text), shifts)
+
+
+def shift_codes(codes, shifts):
+    """
+    Broadcast version of vigenere_shift, working on an unsigned NumPy array of character codes.
+    :return: New array of the shifted codes
+    """
+    key_array = np.array([shift % 26 for shift in shifts], dtype=codes.dtype)
+    return shift_codes_by(codes, np.tile(key_array, len(codes) // len(key_array) + 1)[:len(codes)])
+
+
+def shift_codes_by(codes, offsets):
+    """
+    Shifts every letter code by its own offset (0 ~ 25, same dtype as codes), leaving other codes unchanged.
+    :return: New array of the shifted codes
+    """
+    # Setting bit 5 folds upper case onto lower case, so one range check finds every letter.
+    # Codes below 'a' wrap around to large values in the unsigned subtraction.
+    relative = (codes | 32) - codes.dtype.type(97)
+    shifted = codes - relative + (relative + offsets) % 26
+    return np.where(relative < 26, shifted, codes)
+
+
+def vigenere_shift_many(texts, shifts):
+    """
+    Runs vigenere_shift on every text of a batch, each one starting from the first key position.
+    With NumPy, the batch is packed into one array and the key position of every character is worked out
+    from the offset of its text, so the whole batch is shifted in one pass.
+    :return: List of the shifted texts
+    """
+    if np is None:
+        return [_vigenere_shift_python(text, shifts) for text in texts]
+
+    buffer, offsets = pack_texts(texts)
+    codes, encoding = text_to_codes(buffer)
+    starts = np.asarray(offsets, dtype=np.int64)
+    phases = np.arange(len(codes), dtype=np.int64) - np.repeat(starts[:-1], np.diff(starts))
+    key_array = np.array([shift % 26 for shift in shifts], dtype=codes.dtype)
+    return unpack_texts(codes_to_text(shift_codes_by(codes, key_array[phases % len(key_array)]), encoding),
+                        offsets)
+
+
+def text_to_codes(text):
+    """
+    Converts a string to a NumPy array with one element per character. ASCII text becomes a uint8
+    array, anything else uint32 code points, so that positions still line up with characters.
+    :return: (array, encoding to pass to codes_to_text)
+    """
+    if text.isascii():
+        return np.frombuffer(text.encode('ascii'), dtype=np.uint8), 'ascii'
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32), 'utf-32-le'
+
+
+def codes_to_text(codes, encoding):
+    """
+    Converts an array made by text_to_codes back to a string.
+    """
+    return codes.tobytes().decode(encoding)
+
+
+def _vigenere_shift_numpy(text, shifts):
+    codes, encoding = text_to_codes(text)
+    return codes_to_text(shift_codes(codes, shifts), encoding)
+
+
+def _vigenere_shift_python(text, shifts):
+    """
+    Pure Python version of vigenere_shift. Every key position is a strided slice of the text,
+    so each one can be shifted with a single translate call.
+    """
+    chars = list(text)
+    step = len(shifts)
+    for i, shift in enumerate(shifts):
+        chars[i::step] = text[i::step].translate(SHIFT_TABLES[shift % 26])
+    return "".join(chars)
+
+
+def _vigenere_shift_bytes(data, shifts):
+    """
+    Pure Python version of vigenere_shift for bytes, shifting each key position's slice in place.
+    """
+    out = bytearray(data)
+    step = len(shifts)
+    for i, shift in enumerate(shifts):
+        out[i::step] = data[i::step].translate(BYTE_SHIFT_TABLES[shift % 26])
+    return bytes(out)
+
+
+class TranspositionEncryptStream:
+    """
+    Streams the transposition cipher's encryption. The odd characters come first in the cipher text, so
+    they are passed straight through, while the even characters are spooled to a temporary file until the
+    input ends.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.evens = CharSpool()
+
+    def update(self, chunk):
+        chunk = "".join(chunk.split())
+        parity = self.count % 2
+        self.count += len(chunk)
+        self.evens.write(chunk[parity::2])
+        return chunk[1 - parity::2]
+
+    def finish(self):
+        for start in range(0, self.evens.length, CHUNK_SIZE):
+            yield self.evens.read(start, CHUNK_SIZE)
+        self.evens.close()
+
+
+class TranspositionDecryptStream:
+    """
+    Streams the transposition cipher's decryption. Where the halves split is only known once the input
+    ends, so the cipher text is spooled to a temporary file and both halves are read back together.
+    """
+
+    def __init__(self):
+        self.spool = CharSpool()
+
+    def update(self, chunk):
+        self.spool.write(chunk)
+        return ""
+
+    def finish(self):
+        halflen = self.spool.length // 2
+        for start in range(0, halflen, CHUNK_SIZE):
+            odd_chars = self.spool.read(start, min(CHUNK_SIZE, halflen - start))
+            even_chars = self.spool.read(halflen + start, len(odd_chars))
+            yield "".join(map(str.__add__, even_chars, odd_chars))
+        if self.spool.length % 2 == 1:  # The even half has one character more
+            yield self.spool.read(self.spool.length - 1, 1)
+        self.spool.close()
 
 
 class TranspositionCipher(Cipher):
@@ -31,16 +236,7 @@ class TranspositionCipher(Cipher):
         Encrypts the text using the algorithm mentioned above.
         """
         text = "".join(text.split())
-        even_chars = ""
-        odd_chars = ""
-        char_count = 0
-        for ch in text:
-            if char_count % 2 == 0:
-                even_chars += ch
-            else:
-                odd_chars += ch
-            char_count += 1
-        return "%s%s" % (odd_chars, even_chars)
+        return text[1::2] + text[0::2]
 
     def decrypt(self, plain_text, key=None):
         """
@@ -49,14 +245,247 @@ class TranspositionCipher(Cipher):
         is passed, there will be no effect.
         :return: The cipher text taken through the decryption algorithm.
         """
-        text = ""
         halflen = len(plain_text) // 2
-        odd_chars = plain_text[:halflen]
-        even_chars = plain_text[halflen:]
-        for idx in range(len(odd_chars)):
-            text += even_chars[idx]
-            text += odd_chars[idx]
-        return text
+        text = list(plain_text)
+        text[0::2] = plain_text[halflen:]
+        text[1::2] = plain_text[:halflen]
+        return "".join(text)
+
+    def encrypt_bytes(self, data, key=None):
+        """
+        encrypt() for ASCII bytes. Whitespace is dropped by a translate call instead of split and join.
+        :return: Encrypted bytes
+        """
+        data = as_bytes(data).translate(None, WHITESPACE_BYTES)
+        return data[1::2] + data[0::2]
+
+    def decrypt_bytes(self, data, key=None):
+        """
+        decrypt() for ASCII bytes, interleaving the two halves into a bytearray.
+        :return: Decrypted bytes
+        """
+        data = as_bytes(data)
+        halflen = len(data) // 2
+        out = bytearray(len(data))
+        out[0::2] = data[halflen:]
+        out[1::2] = data[:halflen]
+        return bytes(out)
+
+    def stream_encryptor(self, key=None):
+        return TranspositionEncryptStream()
+
+    def stream_decryptor(self, key=None):
+        return TranspositionDecryptStream()
+
+
+class ColumnarTranspositionCipher(Cipher):
+    """
+    Algorithm:
+        The keyed columnar transposition writes the text out in rows as wide as the key, then reads it off
+        column by column, in the alphabetical order of the key letters (left to right for repeated letters).
+        eg.
+            [key]: zebra         -> read order 4 2 1 3 0
+            [plaintext]: wearediscoveredfleeatonce
+            z e b r a
+            ---------
+            w e a r e
+            d i s c o
+            v e r e d
+            f l e e a
+            t o n c e
+            [ciphertext]: eodae asren eielo rceec wdvft
+        The read order of every position only depends on the key and the length of the text, so it is computed
+        as a permutation, and each direction is a single gather (or scatter) through it. Only the column order
+        of the key is cached; the permutation is as long as the text, so it is built for each text.
+    Security:
+        Low - Medium
+        Like the transposition cipher, the letter frequencies are left untouched, but the key has to be guessed
+        before the text can be read.
+    """
+
+    def build_key_schedule(self, key):
+        """
+        :return: The order the columns are read in, or an empty list if the key has no letters or digits
+        """
+        key = [c for c in str(key or "").lower() if c.isalnum()]
+        return sorted(range(len(key)), key=lambda column: (key[column], column))
+
+    def permutation(self, order, length):
+        """
+        The read order for a text of [length] characters.
+        :param order: The column order, from key_schedule
+        :return: NumPy index array, so that cipher_text = text[permutation] and text[permutation] = cipher_text
+        """
+        dtype = np.uint32 if length < 2 ** 32 else np.uint64
+        return np.concatenate([np.arange(column, length, len(order), dtype=dtype) for column in order])
+
+    def encrypt(self, text, key=None):
+        """
+        Encrypts the text by reading its columns off in key order
+        :return: Encrypted text
+        """
+        order = self.key_schedule(key)
+        if not order:
+            return "To use the columnar transposition cipher, the key must contain a letter or a digit."
+
+        if np is not None:
+            codes, encoding = text_to_codes(text)
+            return codes_to_text(codes[self.permutation(order, len(codes))], encoding)
+        return "".join(text[column::len(order)] for column in order)
+
+    def decrypt(self, text, key=None):
+        """
+        Decrypts the text by writing the columns back in key order
+        :return: Attempted decrypted text
+        """
+        order = self.key_schedule(key)
+        if not order:
+            return "To use the columnar transposition cipher, the key must contain a letter or a digit."
+
+        if np is not None:
+            codes, encoding = text_to_codes(text)
+            plain_codes = np.empty_like(codes)
+            plain_codes[self.permutation(order, len(codes))] = codes
+            return codes_to_text(plain_codes, encoding)
+
+        return self.write_columns(text, order)
+
+    @staticmethod
+    def write_columns(text, order):
+        """
+        Pure Python decryption: writes each column of the cipher text back in place.
+        :param order: The column order, from key_schedule
+        """
+        plain_text = list(text)
+        start = 0
+        for column in order:
+            count = len(range(column, len(text), len(order)))
+            plain_text[column::len(order)] = text[start:start + count]
+            start += count
+        return "".join(plain_text)
+
+    def encrypt_many(self, texts, key=None):
+        """
+        Encrypts a batch of texts. With NumPy, the permutations of all the texts are joined into one index
+        over the packed batch, so the whole batch is a single gather.
+        :return: List of encrypted texts
+        """
+        order = self.key_schedule(key)
+        if not order:
+            return ["To use the columnar transposition cipher, the key must contain a letter or a digit."] * len(texts)
+        if np is None:
+            return ["".join(text[column::len(order)] for column in order) for text in texts]
+        return self.gather_many(texts, order, False)
+
+    def decrypt_many(self, texts, key=None):
+        """
+        Decrypts a batch of texts, like encrypt_many.
+        :return: List of decrypted texts
+        """
+        order = self.key_schedule(key)
+        if not order:
+            return ["To use the columnar transposition cipher, the key must contain a letter or a digit."] * len(texts)
+        if np is None:
+            return [self.write_columns(text, order) for text in texts]
+        return self.gather_many(texts, order, True)
+
+    def gather_many(self, texts, order, decrypting):
+        """
+        :param order: The column order, from key_schedule
+        :param decrypting: Scatter through the permutations instead of gathering
+        """
+        buffer, offsets = pack_texts(texts)
+        codes, encoding = text_to_codes(buffer)
+        index = np.empty(len(codes), dtype=np.int64)
+        # One permutation per length in this batch, dropped with it, so texts of the same length share theirs
+        permutations = {}
+        for i, text in enumerate(texts):
+            if text:
+                if len(text) not in permutations:
+                    permutations[len(text)] = self.permutation(order, len(text))
+                index[offsets[i]:offsets[i + 1]] = permutations[len(text)]
+                index[offsets[i]:offsets[i + 1]] += offsets[i]
+        if decrypting:
+            out = np.empty_like(codes)
+            out[index] = codes
+        else:
+            out = codes[index]
+        return unpack_texts(codes_to_text(out, encoding), offsets)
+
+    def encrypt_bytes(self, data, key=None):
+        """
+        encrypt() for ASCII bytes. With NumPy, the input buffer is gathered through the permutation without
+        being copied first.
+        :return: Encrypted bytes. An invalid key raises ValueError.
+        """
+        order = self.key_schedule(key)
+        if not order:
+            raise ValueError("To use the columnar transposition cipher, the key must contain a letter or a digit.")
+
+        if np is not None:
+            codes = np.frombuffer(data, dtype=np.uint8)
+            return codes[self.permutation(order, len(codes))].tobytes()
+        data = as_bytes(data)
+        return b"".join(data[column::len(order)] for column in order)
+
+    def decrypt_bytes(self, data, key=None):
+        """
+        decrypt() for ASCII bytes, writing the columns back into a bytearray without NumPy.
+        :return: Decrypted bytes. An invalid key raises ValueError.
+        """
+        order = self.key_schedule(key)
+        if not order:
+            raise ValueError("To use the columnar transposition cipher, the key must contain a letter or a digit.")
+
+        if np is not None:
+            codes = np.frombuffer(data, dtype=np.uint8)
+            plain_codes = np.empty_like(codes)
+            plain_codes[self.permutation(order, len(codes))] = codes
+            return plain_codes.tobytes()
+
+        data = as_bytes(data)
+        plain_text = bytearray(len(data))
+        start = 0
+        for column in order:
+            count = len(range(column, len(data), len(order)))
+            plain_text[column::len(order)] = data[start:start + count]
+            start += count
+        return bytes(plain_text)
+
+    def stream_encryptor(self, key=None):
+        if not self.key_schedule(key):
+            raise ValueError("To use the columnar transposition cipher, the key must contain a letter or a digit.")
+        return BufferedStream(self.encrypt, key)
+
+    def stream_decryptor(self, key=None):
+        if not self.key_schedule(key):
+            raise ValueError("To use the columnar transposition cipher, the key must contain a letter or a digit.")
+        return BufferedStream(self.decrypt, key)
+
+
+class TranslateStream:
+    """
+    Stream that shifts every chunk by the same amount. Keeps no state between chunks.
+    Chunks can be strings, or bytes-like objects (eg. slices of a memory mapped file).
+    """
+
+    def __init__(self, shift):
+        self.table = SHIFT_TABLES[shift]
+        self.byte_table = BYTE_SHIFT_TABLES[shift]
+
+    def update(self, chunk):
+        if isinstance(chunk, str):
+            return chunk.translate(self.table)
+        return bytes(chunk).translate(self.byte_table)
+
+    def seek(self, position):
+        """
+        Every position is shifted the same way, so there is nothing to move.
+        """
+        pass
+
+    def finish(self):
+        return ()
 
 
 class CaesarCipher(Cipher):
@@ -64,6 +493,7 @@ class CaesarCipher(Cipher):
     Algorithm:
         The caesar cipher shifts the plaintext a certain number of characters. The integer key that is selected
         defines the number of characters the text is shifted.
+        Every shift is looked up in SHIFT_TABLES, so a whole string is shifted in a single str.translate call.
     Security:
         Low
         Although the letter frequencies will be shifted, the frequency distribution will still be visible,
@@ -104,21 +534,25 @@ class CaesarCipher(Cipher):
             return char
         return chr(num)
 
+    def build_key_schedule(self, key):
+        """
+        Reduces the key to the shift used by each direction.
+        :return: (encryption shift, decryption shift), both 0 ~ 25
+        """
+        key = int(key)
+        return key % 26, -key % 26
+
     def encrypt(self, text, key=None):
         """
         Encrypts the text with the key using the algorithm of the caesar cipher
         :return: Encrypted text
         """
         try:
-            key = int(key)
-        except:
+            shift, _ = self.key_schedule(key)
+        except (TypeError, ValueError):
             return "To use the caesar cipher, the key must be an integer."
 
-        if isinstance(key, int):
-            cipher_text = ""
-            for c in text:
-                cipher_text += self.shift_char(c, key)
-            return cipher_text
+        return text.translate(SHIFT_TABLES[shift])
 
     def decrypt(self, text, key=None):
         """
@@ -126,14 +560,100 @@ class CaesarCipher(Cipher):
         :return: The attempted decrypted text
         """
         try:
-            key = int(key)
-        except:
+            _, shift = self.key_schedule(key)
+        except (TypeError, ValueError):
             return "To use the caesar cipher, the key must be an integer."
-        if isinstance(key, int):
-            plain_text = ""
-            for c in text:
-                plain_text += self.shift_char(c, 26 - key)
-            return plain_text
+
+        return text.translate(SHIFT_TABLES[shift])
+
+    def encrypt_many(self, texts, key=None):
+        """
+        Encrypts a batch of texts with one translate call over the packed batch
+        :return: List of encrypted texts
+        """
+        try:
+            shift, _ = self.key_schedule(key)
+        except (TypeError, ValueError):
+            return ["To use the caesar cipher, the key must be an integer."] * len(texts)
+
+        buffer, offsets = pack_texts(texts)
+        return unpack_texts(buffer.translate(SHIFT_TABLES[shift]), offsets)
+
+    def decrypt_many(self, texts, key=None):
+        """
+        Decrypts a batch of texts with one translate call over the packed batch
+        :return: List of decrypted texts
+        """
+        try:
+            _, shift = self.key_schedule(key)
+        except (TypeError, ValueError):
+            return ["To use the caesar cipher, the key must be an integer."] * len(texts)
+
+        buffer, offsets = pack_texts(texts)
+        return unpack_texts(buffer.translate(SHIFT_TABLES[shift]), offsets)
+
+    def encrypt_bytes(self, data, key=None):
+        """
+        encrypt() for ASCII bytes, with one bytes.translate call
+        :return: Encrypted bytes. An invalid key raises ValueError.
+        """
+        try:
+            shift, _ = self.key_schedule(key)
+        except (TypeError, ValueError):
+            raise ValueError("To use the caesar cipher, the key must be an integer.")
+
+        return as_bytes(data).translate(BYTE_SHIFT_TABLES[shift])
+
+    def decrypt_bytes(self, data, key=None):
+        """
+        decrypt() for ASCII bytes, with one bytes.translate call
+        :return: Decrypted bytes. An invalid key raises ValueError.
+        """
+        try:
+            _, shift = self.key_schedule(key)
+        except (TypeError, ValueError):
+            raise ValueError("To use the caesar cipher, the key must be an integer.")
+
+        return as_bytes(data).translate(BYTE_SHIFT_TABLES[shift])
+
+    def stream_encryptor(self, key=None):
+        try:
+            shift, _ = self.key_schedule(key)
+        except (TypeError, ValueError):
+            raise ValueError("To use the caesar cipher, the key must be an integer.")
+        return TranslateStream(shift)
+
+    def stream_decryptor(self, key=None):
+        try:
+            _, shift = self.key_schedule(key)
+        except (TypeError, ValueError):
+            raise ValueError("To use the caesar cipher, the key must be an integer.")
+        return TranslateStream(shift)
+
+
+class VigenereStream:
+    """
+    Streams the Viginere cipher, remembering where in the key the next chunk starts.
+    Chunks can be strings, or bytes-like objects.
+    """
+
+    def __init__(self, shifts):
+        self.shifts = shifts
+        self.position = 0
+
+    def update(self, chunk):
+        offset = self.position % len(self.shifts)
+        self.position += len(chunk)
+        return vigenere_shift(chunk, self.shifts[offset:] + self.shifts[:offset])
+
+    def seek(self, position):
+        """
+        Makes the next chunk start at [position] in the text, so the text can be split anywhere.
+        """
+        self.position = position
+
+    def finish(self):
+        return ()
 
 
 class ViginereCipher(Cipher):
@@ -186,40 +706,345 @@ class ViginereCipher(Cipher):
 
         return key_list
 
+    def build_key_schedule(self, key):
+        """
+        Converts the key to the shifts used by each direction.
+        :return: (encryption shifts, decryption shifts). Both are empty if the key has no letters or digits.
+        """
+        key_list = self.key_to_int(key or "")
+        return key_list, [26 - k for k in key_list]
+
     def encrypt(self, text, key=None):
         """
         Encrypts the text using the key with the Viginere cipher
         :return: Encrypted text
         """
-        cipher_text = ""
-        key_list = self.key_to_int(key)
+        key_list, _ = self.key_schedule(key)
+        if not key_list:
+            return "To use the Viginere cipher, the key must contain a letter or a digit."
 
-        for i in range(0, len(text), len(key_list)):
-            for j in range(len(key_list)):
-                try:
-                    cipher_text += self.caesar.encrypt(text[i + j], key_list[j])
-                except IndexError:
-                    break
-        return cipher_text
+        return vigenere_shift(text, key_list)
 
     def decrypt(self, text, key=None):
         """
         Decrypts the text using the key with the Viginere cipher
         :return: Attempted decrypted text
         """
-        plain_text = ""
-        keys = self.key_to_int(key)
-        key_list = []
-        for key in keys:
-            key_list.append(26 - key)
+        _, key_list = self.key_schedule(key)
+        if not key_list:
+            return "To use the Viginere cipher, the key must contain a letter or a digit."
+
+        return vigenere_shift(text, key_list)
+
+    def encrypt_many(self, texts, key=None):
+        """
+        Encrypts a batch of texts, each starting from the first letter of the key
+        :return: List of encrypted texts
+        """
+        key_list, _ = self.key_schedule(key)
+        if not key_list:
+            return ["To use the Viginere cipher, the key must contain a letter or a digit."] * len(texts)
+
+        return vigenere_shift_many(texts, key_list)
+
+    def decrypt_many(self, texts, key=None):
+        """
+        Decrypts a batch of texts, each starting from the first letter of the key
+        :return: List of decrypted texts
+        """
+        _, key_list = self.key_schedule(key)
+        if not key_list:
+            return ["To use the Viginere cipher, the key must contain a letter or a digit."] * len(texts)
+
+        return vigenere_shift_many(texts, key_list)
+
+    def encrypt_bytes(self, data, key=None):
+        """
+        encrypt() for ASCII bytes. NumPy reads the input buffer in place; without it, each key position is
+        translated into a bytearray.
+        :return: Encrypted bytes. An invalid key raises ValueError.
+        """
+        key_list, _ = self.key_schedule(key)
+        if not key_list:
+            raise ValueError("To use the Viginere cipher, the key must contain a letter or a digit.")
+
+        return vigenere_shift(data, key_list)
 
-        for i in range(0, len(text), len(key_list)):
-            for j in range(len(key_list)):
-                try:
-                    plain_text += self.caesar.encrypt(text[i + j], key_list[j])
-                except IndexError:
-                    break
-        return plain_text
+    def decrypt_bytes(self, data, key=None):
+        """
+        decrypt() for ASCII bytes
+        :return: Decrypted bytes. An invalid key raises ValueError.
+        """
+        _, key_list = self.key_schedule(key)
+        if not key_list:
+            raise ValueError("To use the Viginere cipher, the key must contain a letter or a digit.")
+
+        return vigenere_shift(data, key_list)
+
+    def stream_encryptor(self, key=None):
+        key_list, _ = self.key_schedule(key)
+        if not key_list:
+            raise ValueError("To use the Viginere cipher, the key must contain a letter or a digit.")
+        return VigenereStream(key_list)
+
+    def stream_decryptor(self, key=None):
+        _, key_list = self.key_schedule(key)
+        if not key_list:
+            raise ValueError("To use the Viginere cipher, the key must contain a letter or a digit.")
+        return VigenereStream(key_list)
+
+
+PLAYFAIR_ALPHABET = "abcdefghiklmnopqrstuvwxyz"
+PLAYFAIR_INDEX = {c: i for i, c in enumerate(PLAYFAIR_ALPHABET)}
+
+
+def playfair_letters(text):
+    """
+    Step 1 of the playfair cipher: folds the text to lower case, merges 'j' into 'i', and drops every
+    character that is not in the key square.
+    """
+    return "".join(c for c in text.lower().replace('j', 'i') if c in PLAYFAIR_INDEX)
+
+
+# Digraph numbers: the pair of alphabet indices (a, b) is numbered a * 25 + b, so each of the 625 possible
+# digraphs is an index into a table of what it turns into
+PLAYFAIR_PAIRS = [a + b for a in PLAYFAIR_ALPHABET for b in PLAYFAIR_ALPHABET]
+PLAYFAIR_X = PLAYFAIR_INDEX['x']
+
+# What decrypting an odd number of letters gives
+PLAYFAIR_ODD_LENGTH = "This was NOT encrypted using the Playfair cipher, or was modified after encryption."
+
+# bytes.translate arguments for step 1 on ASCII bytes: every byte that is not a letter is deleted, the rest
+# become their index in the alphabet, with 'j' merged into 'i'
+PLAYFAIR_INDEX_TABLE = bytes.maketrans(
+    (string.ascii_uppercase + string.ascii_lowercase).encode('ascii'),
+    bytes(PLAYFAIR_INDEX[c] for c in (string.ascii_lowercase * 2).replace('j', 'i')))
+PLAYFAIR_BYTE_DELETE = bytes(c for c in range(256) if not chr(c).isascii() or not chr(c).isalpha())
+
+
+def playfair_pair_table(pairs):
+    """
+    :param pairs: The 625 letter pairs, in digraph number order
+    :return: The table render_digraphs looks digraph numbers up in. With NumPy, the pairs as an array of
+             uint16 ASCII codes, so a whole text is rendered by one gather. Otherwise (str pairs, bytes pairs).
+    """
+    if np is not None:
+        return np.frombuffer("".join(pairs).encode('ascii'), dtype=np.uint16)
+    return list(pairs), [pair.encode('ascii') for pair in pairs]
+
+
+def render_digraphs(digraphs, table, as_bytes=False):
+    """
+    :param digraphs: Digraph numbers, as made by PlayfairNormalizer
+    :param table: A table made by playfair_pair_table
+    :return: The pairs of the digraphs in the table, as a string (or ASCII bytes)
+    """
+    if np is not None:
+        data = table[digraphs].tobytes()
+        return data if as_bytes else data.decode('ascii')
+    pairs = table[1] if as_bytes else table[0]
+    return (b"" if as_bytes else "").join(map(pairs.__getitem__, digraphs))
+
+
+PLAYFAIR_PAIR_TABLE = playfair_pair_table(PLAYFAIR_PAIRS)
+
+
+class PlayfairNormalizer:
+    """
+    Steps 1 ~ 4 of the playfair cipher fused into one pass: a single translate call folds the case, merges
+    'j' into 'i', drops everything outside the key square and turns each letter into its alphabet index in
+    one go, then an 'x' is put between doubled pairs and the indices are read off in pairs as digraph numbers.
+    Works on a text in chunks of any size; a chunk that ends halfway through a digraph leaves its odd
+    letter pending until the next one, so a doubled pair split between two chunks is still found.
+        encrypting: Whether to apply steps 2 and 3. Cipher text (or text that is already prepared) is only
+                    read off in pairs, and must have an even number of letters.
+        pending: The alphabet index of the odd letter, as bytes, or b"" if there is none
+    """
+
+    def __init__(self, encrypting=True):
+        self.encrypting = encrypting
+        self.pending = b""
+
+    def update(self, chunk):
+        """
+        :param chunk: A string, or ASCII bytes (any object supporting the buffer protocol)
+        :return: The digraph numbers of the chunk, as a NumPy array (a list without NumPy)
+        """
+        if isinstance(chunk, str):
+            chunk = chunk.encode('ascii', 'ignore')  # Nothing outside ASCII is in the key square
+        indices = self.pending + as_bytes(chunk).translate(PLAYFAIR_INDEX_TABLE, PLAYFAIR_BYTE_DELETE)
+        if self.encrypting:
+            indices = self.separate(indices)
+        end = len(indices) - len(indices) % 2
+        self.pending = indices[end:]
+        return self.pair(indices[:end])
+
+    def finish(self):
+        """
+        :return: The digraph numbers of the pending letter, padded with an 'x' when encrypting. Cipher text
+                 with a letter left over raises ValueError (PLAYFAIR_ODD_LENGTH).
+        """
+        pending, self.pending = self.pending, b""
+        if pending and self.encrypting:
+            return self.pair(pending + bytes([PLAYFAIR_X]))
+        if pending:
+            raise ValueError(PLAYFAIR_ODD_LENGTH)
+        return self.pair(b"")
+
+    def normalize(self, text):
+        """
+        :return: The digraph numbers of a whole text
+        """
+        digraphs = self.update(text)
+        tail = self.finish()
+        if not len(tail):
+            return digraphs
+        if np is not None:
+            return np.concatenate((digraphs, tail))
+        return digraphs + tail
+
+    @staticmethod
+    def separate(indices):
+        """
+        Step 2. Reading the letters off in pairs, an 'x' goes between the two letters of any doubled pair, and
+        the second one starts the next pair. Cutting the letters wherever the same letter comes twice in a
+        row, every pair lies within one piece, and each piece starts a pair; so this is the same as putting
+        an 'x' after every piece of odd length. The last piece is left alone, as it may go on in the next
+        chunk (step 3 pads it if it does not).
+        :param indices: Alphabet indices as bytes, starting at the beginning of a pair
+        :return: The indices with the 'x's put in, as bytes
+        """
+        if np is not None:
+            codes = np.frombuffer(indices, dtype=np.uint8)
+            cuts = np.flatnonzero(codes[1:] == codes[:-1]) + 1
+            if not len(cuts):
+                return indices
+            odd = np.diff(cuts, prepend=0) % 2 == 1
+            return np.insert(codes, cuts[odd], PLAYFAIR_X).tobytes()
+        out = bytearray()
+        start = 0
+        for i in range(1, len(indices)):
+            if indices[i] == indices[i - 1]:
+                out += indices[start:i]
+                if (i - start) % 2:
+                    out.append(PLAYFAIR_X)
+                start = i
+        out += indices[start:]
+        return bytes(out)
+
+    def pair(self, indices):
+        """
+        :param indices: An even number of alphabet indices, as bytes
+        :return: Their digraph numbers
+        """
+        if np is not None:
+            codes = np.frombuffer(indices, dtype=np.uint8)
+            return codes[0::2].astype(np.uint16) * 25 + codes[1::2]
+        return [a * 25 + b for a, b in zip(indices[0::2], indices[1::2])]
+
+
+def join_digraphs(parts):
+    """
+    pack_texts for digraph numbers: several texts are rendered in one pass, then split with unpack_texts.
+    :param parts: The digraph numbers of each text
+    :return: (the digraph numbers of every text as one array or list, offsets of each text once rendered)
+    """
+    offsets = [0]
+    for part in parts:
+        offsets.append(offsets[-1] + 2 * len(part))
+    if np is not None:
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.uint16), offsets
+    return [digraph for part in parts for digraph in part], offsets
+
+
+class PlayfairKeySquare:
+    """
+    The key square of a playfair cipher for one key, with every lookup worked out in advance.
+        rows: The 5 x 5 square itself
+        position: Maps each letter to its (row, column) in the square
+        encrypt_map, decrypt_map: Map each of the 25 x 25 possible digraphs to its encrypted/decrypted pair
+        encrypt_table, decrypt_table: The same, as tables indexed by digraph number (see playfair_pair_table)
+    Once built, encrypting or decrypting a digraph is a single lookup.
+    """
+
+    def __init__(self, key):
+        """
+        Builds the square from the key. Upper case letters are folded to lower case, 'j' is merged into 'i',
+        and anything else that is not in the alphabet is ignored.
+        """
+        letters = []
+        for c in key.lower().replace('j', 'i') + PLAYFAIR_ALPHABET:
+            if c in PLAYFAIR_INDEX and c not in letters:
+                letters.append(c)
+
+        self.rows = [letters[i:i + 5] for i in range(0, 25, 5)]
+        self.position = {}
+        for i, c in enumerate(letters):
+            self.position[c] = divmod(i, 5)
+        self.encrypt_map = self.build_map(1)
+        self.decrypt_map = self.build_map(-1)
+        self.encrypt_table = playfair_pair_table([self.encrypt_map[pair] for pair in PLAYFAIR_PAIRS])
+        self.decrypt_table = playfair_pair_table([self.decrypt_map[pair] for pair in PLAYFAIR_PAIRS])
+
+    def build_map(self, step):
+        """
+        Applies the playfair rules to every digraph.
+        :param step: 1 to move right/down when encrypting, -1 to move left/up when decrypting.
+        :return: Dictionary of digraph -> substituted digraph
+        """
+        rows = self.rows
+        digraph_map = {}
+        for char1, (char1_y, char1_x) in self.position.items():
+            for char2, (char2_y, char2_x) in self.position.items():
+                if char1_y == char2_y:  # If on the same row
+                    pair = rows[char1_y][(char1_x + step) % 5] + rows[char2_y][(char2_x + step) % 5]
+                elif char1_x == char2_x:  # If on the same column
+                    pair = rows[(char1_y + step) % 5][char1_x] + rows[(char2_y + step) % 5][char2_x]
+                else:
+                    pair = rows[char1_y][char2_x] + rows[char2_y][char1_x]
+                digraph_map[char1 + char2] = pair
+        return digraph_map
+
+    def encrypt(self, text):
+        """
+        :param text: Prepared text, an even number of letters from the key square
+        :return: Encrypted text
+        """
+        return "".join(map(self.encrypt_map.__getitem__, map(str.__add__, text[0::2], text[1::2])))
+
+    def decrypt(self, text):
+        """
+        :param text: Cipher text, an even number of letters from the key square
+        :return: Decrypted text
+        """
+        return "".join(map(self.decrypt_map.__getitem__, map(str.__add__, text[0::2], text[1::2])))
+
+    def convert(self, digraphs, encrypting, as_bytes=False):
+        """
+        :param digraphs: Digraph numbers, as made by PlayfairNormalizer
+        :return: The encrypted or decrypted text, as a string (or ASCII bytes)
+        """
+        return render_digraphs(digraphs, self.encrypt_table if encrypting else self.decrypt_table, as_bytes)
+
+
+class PlayfairStream:
+    """
+    Streams the playfair cipher. The normalizer holds back the odd letter of a chunk that ends halfway
+    through a digraph, and pairs it with the first letter of the next chunk.
+    """
+
+    def __init__(self, square, encrypting):
+        self.square = square
+        self.encrypting = encrypting
+        self.normalizer = PlayfairNormalizer(encrypting)
+
+    def update(self, chunk):
+        return self.square.convert(self.normalizer.update(chunk), self.encrypting)
+
+    def finish(self):
+        digraphs = self.normalizer.finish()
+        if len(digraphs):
+            yield self.square.convert(digraphs, self.encrypting)
 
 
 class PlayfairCipher(Cipher):
@@ -238,10 +1063,10 @@ class PlayfairCipher(Cipher):
 
         1. Remove any punctuation or characters that are not present in the key square (this may mean spelling out
            numbers, punctuation etc.).
-        2. Identify any double letters in the plaintext and replace the second occurence with an 'x'
-           e.g. 'hammer' -> 'hamxer'.
+        2. Identify any double letters that would fall in the same pair and insert an 'x' between them
+           e.g. 'hammer' -> 'hamxmer'.
         3. If the plaintext has an odd number of characters, append an 'x' to the end to make it even.
-        4. Break the plaintext into pairs of letters, e.g. 'hamxer' -> 'ha mx er'
+        4. Break the plaintext into pairs of letters, e.g. 'hamxmerx' -> 'ha mx me rx'
         5. The algorithm now works on each of the letter pairs.
         6. Locate the letters in the key square, (the examples given are using the key square above)
             a. If the letters are in different rows and columns, replace the pair with the letters on the same
@@ -267,9 +1092,9 @@ class PlayfairCipher(Cipher):
         Creates instance of list of alphabet, used later for comparison, and an empty key_square to be
         filled when necessary
         """
-        self.alphabet = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'k', 'l', 'm', \
-                    'n', 'o', 'p', 'q', 'r', 's', 't', 'u', 'v', 'w', 'x', 'y', 'z']
+        self.alphabet = list(PLAYFAIR_ALPHABET)
         self.key_square = []
+        self.square = None
 
     def get_key_square(self):
         """
@@ -277,97 +1102,36 @@ class PlayfairCipher(Cipher):
         """
         return self.key_square
 
+    def build_key_schedule(self, key):
+        """
+        :return: The PlayfairKeySquare of the key. A key that is not a string (no key given) raises ValueError.
+        """
+        if not isinstance(key, str):
+            raise ValueError("To use the Playfair cipher, the key must be a string of letters.")
+        return PlayfairKeySquare(key)
+
     def fill_key_square(self, key):
         """
-        Fills key square using the given key.
+        Fills key square using the given key, replacing whatever square was there before.
         """
-        temp_key_square = []
-        for c in key:
-            if c not in temp_key_square:
-                temp_key_square.append(c)
-        for c in self.alphabet:
-            if c not in temp_key_square:
-                temp_key_square.append(c)
-
-        for i in range(0, 25, 5):
-            key_row = []
-            for j in range(5):
-                try:
-                    key_row.append(temp_key_square[i + j])
-                except IndexError:
-                    pass
-            self.key_square.append(key_row)
+        self.square = self.key_schedule(key)
+        self.key_square = self.square.rows
 
     def find_pair(self, digraph, encrypting=True):
         """
-        Searches the key_square for the corresponding pair of the pair.
+        Looks up the corresponding pair of the pair in the precomputed digraph maps.
         :param encrypting: Search changes depending on whether encrypting or decrypting.
         """
-        char1 = digraph[0]
-        char2 = digraph[1]
-
-        # Coordinates of each char on the key_square
-        char1_x = 0
-        char1_y = 0
-        char2_x = 0
-        char2_y = 0
-
-        for y in range(5):
-            for x in range(5):
-                if self.key_square[y][x] == char1:
-                    char1_x = x
-                    char1_y = y
-                elif self.key_square[y][x] == char2:
-                    char2_x = x
-                    char2_y = y
-
-        newchar1 = ''
-        newchar2 = ''
-        if char1_y != char2_y:  # If not on the same row
-            if char1_x != char2_x:  # If not on the same column
-                newchar1 = self.key_square[char1_y][char2_x]
-                newchar2 = self.key_square[char2_y][char1_x]
-            else:  # If on the same column
-                if encrypting:
-                    try:
-                        newchar1 = self.key_square[char1_y + 1][char1_x]
-                    except IndexError:
-                        newchar1 = self.key_square[0][char1_x]
-                    try:
-                        newchar2 = self.key_square[char2_y + 1][char2_x]
-                    except IndexError:
-                        newchar2 = self.key_square[0][char2_x]
-                else:  # IF decrypting
-                    try:
-                        newchar1 = self.key_square[char1_y - 1][char1_x]
-                    except IndexError:
-                        newchar1 = self.key_square[-1][char1_x]
-                    try:
-                        newchar2 = self.key_square[char2_y - 1][char2_x]
-                    except IndexError:
-                        newchar2 = self.key_square[-1][char2_x]
-        else:  # If on the same row
-            if encrypting:
-                try:
-                    newchar1 = self.key_square[char1_y][char1_x + 1]
-                except IndexError:
-                    newchar1 = self.key_square[char1_y][0]
-                try:
-                    newchar2 = self.key_square[char2_y][char2_x + 1]
-                except IndexError:
-                    newchar2 = self.key_square[char2_y][0]
-            else:
-                try:
-                    newchar1 = self.key_square[char1_y][char1_x - 1]
-                except IndexError:
-                    newchar1 = self.key_square[char1_y][-1]
-                try:
-                    newchar2 = self.key_square[char2_y][char2_x - 1]
-                except IndexError:
-                    newchar2 = self.key_square[char2_y][-1]
-
-        return newchar1 + newchar2
+        if encrypting:
+            return self.square.encrypt_map[digraph]
+        return self.square.decrypt_map[digraph]
 
+    def prepare_text(self, text):
+        """
+        Applies steps 1 ~ 4 to the text.
+        :return: The text as a string of an even number of letters, ready to be read off in pairs
+        """
+        return render_digraphs(PlayfairNormalizer().normalize(text), PLAYFAIR_PAIR_TABLE)
 
     def encrypt(self, text, key=None):
         """
@@ -378,60 +1142,110 @@ class PlayfairCipher(Cipher):
             return "Key is too long"
 
         # Generate key square
-        text = "".join(text.split())
         self.fill_key_square(key)
 
-        # Step 1
-        junk = "!@#$%^&*()-_=+\|][}{';\":/.?><,`~1234567890"
-        for char in junk:
-            key = key.replace(char, "")
-
-        # Step 2, 4
-        digraphs = []
-        for i in range(0, len(text), 2):
-            try:
-                digraphs.append(text[i] + text[i + 1])
-            except IndexError:
-                digraphs.append(text[i] + 'x')
+        # Step 1 ~ 4, then 5, 6
+        return self.square.convert(PlayfairNormalizer().normalize(text), encrypting=True)
 
-        # Step 3
-        for i in range(len(digraphs)):
-            if digraphs[i][0] == digraphs[i][1]:
-                digraphs[i] = digraphs[i][0] + 'x'
+    def decrypt(self, text, key=None):
+        """
+        Decrypts the text using the key using the playfair cipher.
+        :return: Decrypted text, or PLAYFAIR_ODD_LENGTH if the text has an odd number of letters
+        """
 
-        cipher_text = ""
-        # Step 5
-        for pair in digraphs:
-            # Step 6
-            cipher_text += self.find_pair(pair, encrypting=True)
+        self.fill_key_square(key)
 
-        return cipher_text
+        try:
+            digraphs = PlayfairNormalizer(encrypting=False).normalize(text)
+        except ValueError as error:
+            return str(error)
+        return self.square.convert(digraphs, encrypting=False)
 
-    def decrypt(self, text, key=None):
+    def encrypt_many(self, texts, key=None):
         """
-        Decrypts the text using the key using the playfair cipher.
+        Encrypts a batch of texts. Each text is normalized on its own, since its digraphs must not run into
+        the next one, then the digraphs of the whole batch are looked up in one pass.
+        :return: List of encrypted texts
         """
+        if len(key) > 25:
+            return ["Key is too long"] * len(texts)
 
         self.fill_key_square(key)
+        digraphs, offsets = join_digraphs([PlayfairNormalizer().normalize(text) for text in texts])
+        return unpack_texts(self.square.convert(digraphs, encrypting=True), offsets)
 
-        digraphs = []
-        for i in range(0, len(text), 2):
+    def decrypt_many(self, texts, key=None):
+        """
+        Decrypts a batch of texts, like encrypt_many.
+        :return: List of decrypted texts, with PLAYFAIR_ODD_LENGTH in place of any text that has an odd number
+                 of letters
+        """
+        self.fill_key_square(key)
+        parts = []
+        errors = {}
+        for i, text in enumerate(texts):
+            normalizer = PlayfairNormalizer(encrypting=False)
             try:
-                digraphs.append(text[i] + text[i + 1])
-            except IndexError:
-                print("This was NOT encrypted using the Playfair cipher, or was modified after encryption.")
+                parts.append(normalizer.normalize(text))
+            except ValueError as error:
+                errors[i] = str(error)
+                parts.append(normalizer.pair(b""))
+        digraphs, offsets = join_digraphs(parts)
+        results = unpack_texts(self.square.convert(digraphs, encrypting=False), offsets)
+        for i, message in errors.items():
+            results[i] = message
+        return results
 
-        plain_text = ""
-        for pair in digraphs:
-            plain_text += self.find_pair(pair, encrypting=False)
+    def encrypt_bytes(self, data, key=None):
+        """
+        encrypt() for ASCII bytes
+        :return: Encrypted bytes. A missing key or one that is too long raises ValueError.
+        """
+        self.fill_key_square(key)
+        if len(key) > 25:
+            raise ValueError("Key is too long")
+
+        return self.square.convert(PlayfairNormalizer().normalize(data), encrypting=True, as_bytes=True)
+
+    def decrypt_bytes(self, data, key=None):
+        """
+        decrypt() for ASCII bytes
+        :return: Decrypted bytes. A missing key or an odd number of letters raises ValueError.
+        """
+        self.fill_key_square(key)
+        digraphs = PlayfairNormalizer(encrypting=False).normalize(data)
+        return self.square.convert(digraphs, encrypting=False, as_bytes=True)
+
+    def stream_encryptor(self, key=None):
+        square = self.key_schedule(key)
+        if len(key) > 25:
+            raise ValueError("Key is too long")
+        return PlayfairStream(square, encrypting=True)
+
+    def stream_decryptor(self, key=None):
+        return PlayfairStream(self.key_schedule(key), encrypting=False)
+
+
+# Names the command line tools use to pick a cipher
+CIPHER_NAMES = {
+    'transposition': TranspositionCipher,
+    'columnar': ColumnarTranspositionCipher,
+    'caesar': CaesarCipher,
+    'viginere': ViginereCipher,
+    'vigenere': ViginereCipher,
+    'playfair': PlayfairCipher,
+}
 
-        return plain_text
 
 if __name__ == "__main__":
     t = TranspositionCipher()
     print("TRANSPOSITION e:", t.encrypt("Hello my name is Shion Fukuzawa"))  # Returns elmnmiSinuuaaHloyaeshoFkzw
     print("TRANSPOSITION d:", t.decrypt("elmnmiSinuuaaHloyaeshoFkzw"))
 
+    ct = ColumnarTranspositionCipher()
+    print("COLUMNAR e:", ct.encrypt("wearediscoveredfleeatonce", "zebra"))  # Returns eodaeasreneielorceecwdvft
+    print("COLUMNAR d:", ct.decrypt("eodaeasreneielorceecwdvft", "zebra"))
+
     c = CaesarCipher()
     print("CAESAR e:", c.encrypt("Shion Fukuzawa", 17))  # Returns Jyzfe Wlblqrnr
     print("CAESAR e:", c.encrypt("Victor Norman", "a"))  # Returns error message to print on GUI
@@ -446,3 +1260,10 @@ if __name__ == "__main__":
     print("PLAYFAIR e:", playfair_ctext)
     playfair_ptext = p.decrypt(playfair_ctext, 'hacker')
     print("PLAYFAIR d:", playfair_ptext)
+
+    # An 'x' goes between doubled letters, also when a stream gets them in two different chunks
+    from cipher import run_stream
+    assert p.prepare_text("hammer") == "hamxmerx"
+    for chunks in (["hel", "lo wor", "ld"], ["hamm", "er"], ["bal", "loon"], ["a", "a", "a"]):
+        streamed = "".join(run_stream(p.stream_encryptor('hacker'), chunks))
+        assert streamed == p.encrypt("".join(chunks), 'hacker'), chunks
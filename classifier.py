@@ -0,0 +1,235 @@
+#
+# CS106 Final Project
+# CryptWing
+#
+# cipher classifier
+#
+# Shion Fukuzawa (sf27)
+# December 15, 2016
+#
+# This file guesses which of the CryptWing ciphers made a cipher text, so the decrypt page can suggest one
+# instead of leaving it to guesswork. Every feature is gathered in a single pass over a sample of bounded
+# size, so identifying a huge file takes as long as identifying a page of text.
+#
+# Features referenced from
+#    http://practicalcryptography.com/cryptanalysis/text-characterisation/identifying-unknown-ciphers/
+#
+
+import random
+
+from classical_ciphers import TranspositionCipher, ColumnarTranspositionCipher, CaesarCipher, ViginereCipher, \
+    PlayfairCipher
+from cracker import average_ioc, column_histograms, position_letters, shift_scores
+from fitness import english_scorer
+
+# Most characters that are looked at, taken as BLOCK_SIZE long blocks at random offsets
+SAMPLE_SIZE = 1 << 14
+BLOCK_SIZE = 1 << 10
+
+# Longest Viginere key whose periodic IoC peak is looked for
+MAX_PERIOD = 20
+
+# Smallest confidence any cipher gets, so the ranking still orders the unlikely ones
+EPSILON = 0.01
+
+
+def clamp(value):
+    """
+    :return: value limited to 0 ~ 1
+    """
+    return min(max(value, 0.0), 1.0)
+
+
+class Features:
+    """
+    What the classifier measures on the sample.
+        letters, others: Letters and other characters seen
+        spaces: Whitespace characters seen
+        unigrams: 26 letter counts
+        pairs, doubles: Letter pairs read off from even positions, and how many of them are a doubled letter
+        columns: Period -> 26 letter counts of each of its columns, by position in the whole text
+        length: Length of the whole text, without surrounding whitespace
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self.letters = 0
+        self.others = 0
+        self.spaces = 0
+        self.unigrams = [0] * 26
+        self.pairs = 0
+        self.doubles = 0
+        self.columns = {period: [[0] * 26 for _ in range(period)] for period in range(1, MAX_PERIOD + 1)}
+
+    def add_block(self, block, offset):
+        """
+        Adds the features of one block of the text.
+        :param offset: Position of the block in the whole text, so columns and pairs line up with it
+        """
+        values = position_letters(block)
+        for period, histograms in self.columns.items():
+            shift = offset % period
+            for column, counts in enumerate(column_histograms(values, period)):
+                target = histograms[(column + shift) % period]
+                for letter in range(26):
+                    target[letter] += counts[letter]
+
+        letters = [int(v) for v in values if v < 26]
+        self.letters += len(letters)
+        self.others += len(block) - len(letters)
+        self.spaces += len(block) - len("".join(block.split()))
+        for letter in letters:
+            self.unigrams[letter] += 1
+        # Playfair pairs are read from even positions; the blocks start at even offsets, so in a text of
+        # letters only, these are the pairs the cipher produced
+        start = offset % 2
+        for i in range(start, len(letters) - 1, 2):
+            self.pairs += 1
+            if letters[i] == letters[i + 1]:
+                self.doubles += 1
+
+    def ioc(self):
+        return average_ioc([self.unigrams])
+
+    def periodic_ioc(self):
+        """
+        :return: (period, average column IoC) of the shortest period from 2 up whose columns look most like
+                 English, the way a Viginere key length stands out
+        """
+        iocs = {period: average_ioc(self.columns[period]) for period in range(2, MAX_PERIOD + 1)}
+        best = max(iocs.values())
+        period = min(p for p in iocs if iocs[p] >= 0.95 * best)
+        return period, iocs[period]
+
+    def rotation(self):
+        """
+        :return: (best caesar shift, how much better it fits English than a typical shift: 0 for a perfect
+                 fit, around 1 when no shift fits)
+        """
+        scores = shift_scores(self.unigrams)
+        best = min(range(26), key=scores.__getitem__)
+        median = sorted(scores)[13]
+        return best, scores[best] / median if median else 1.0
+
+
+class CipherClassifier:
+    """
+    Ranks the ciphers by how well the cipher text fits what each one leaves behind:
+        Caesar: English letter frequencies, rotated by a shift other than 0
+        Transposition, columnar transposition: English letter frequencies, not rotated at all. The
+            transposition cipher also removes all whitespace, and undoing it on a window of the text gives
+            English back.
+        Viginere: Flat letter frequencies overall, but English-like ones in every column of some period
+        Playfair: Only letters, never a 'j', an even length and no doubled letter in any pair
+    """
+
+    def __init__(self, sample_size=SAMPLE_SIZE, block_size=BLOCK_SIZE, seed=0):
+        """
+        :param sample_size: Most characters to look at
+        :param block_size: Length of each sampled block. Must be even.
+        :param seed: Seed of the block offsets, so a text is always classified the same way
+        """
+        self.sample_size = sample_size
+        self.block_size = block_size
+        self.seed = seed
+
+    def bounds(self, text):
+        """
+        :return: (start, end) of the text without surrounding whitespace (eg. the newline at the end of a
+                 file), found without copying the text
+        """
+        start, end = 0, len(text)
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return start, end
+
+    def sample_offsets(self, length):
+        """
+        :return: Sorted offsets (relative to the start of the text) of the blocks to read
+        """
+        if length <= self.sample_size:
+            return [0]
+        blocks = length // self.block_size
+        count = min(self.sample_size // self.block_size, blocks)
+        return sorted(i * self.block_size for i in random.Random(self.seed).sample(range(blocks), count))
+
+    def features(self, text):
+        """
+        :return: Features of a sample of the text
+        """
+        start, end = self.bounds(text)
+        features = Features(end - start)
+        if end - start <= self.sample_size:
+            features.add_block(text[start:end], 0)
+        else:
+            for offset in self.sample_offsets(end - start):
+                features.add_block(text[start + offset:start + offset + self.block_size], offset)
+        return features
+
+    def transposition_gain(self, text):
+        """
+        Undoes the transposition cipher on one window of the text, which only needs the two matching slices
+        of its halves.
+        :return: How much more English-like (in quadgram fitness) the window gets
+        """
+        start, end = self.bounds(text)
+        half = (end - start) // 2
+        width = min(self.block_size, half)
+        if width < 8:
+            return 0.0
+        first = start + random.Random(self.seed).randrange(half - width + 1)
+        evens = text[first + half:first + half + width]
+        odds = text[first:first + width]
+        window = "".join(map(str.__add__, evens, odds))
+        scorer = english_scorer()
+        return scorer.fitness(window) - scorer.fitness(text[first:first + 2 * width])
+
+    def rank(self, text):
+        """
+        :return: List of (cipher class, confidence), most likely first. The confidences add up to 1.
+        """
+        features = self.features(text)
+        ioc = features.ioc()
+        shift, misfit = features.rotation()
+        _, periodic_ioc = features.periodic_ioc()
+
+        rotated = clamp(1 - misfit / 0.4)  # English letters under some shift
+        english = clamp((ioc - 0.047) / 0.013)  # English-like IoC, not flattened by a polyalphabetic key
+        periodic = clamp((periodic_ioc - 0.052) / 0.01) * clamp((periodic_ioc - ioc) / 0.01)
+
+        letters_only = features.others == 0
+        even = features.length % 2 == 0
+        playfair = (letters_only and even and features.unigrams[9] == 0 and features.doubles == 0
+                    and features.pairs > 0)
+        # With few pairs, having no doubled one proves little
+        playfair_evidence = clamp(features.pairs / 50) if playfair else 0.0
+
+        monoalphabetic = rotated * english
+        scores = {
+            CaesarCipher: monoalphabetic * (1.0 if shift != 0 else 0.05),
+            ViginereCipher: periodic * (1 - english) * (1 - 0.8 * playfair_evidence),
+            PlayfairCipher: playfair_evidence * (1 - monoalphabetic),
+        }
+        transposition = monoalphabetic * (1.0 if shift == 0 else 0.05)
+        if features.spaces:
+            unstripped = 0.05
+        else:
+            unstripped = 0.95 if self.transposition_gain(text) > 0.5 else 0.2
+        scores[TranspositionCipher] = transposition * unstripped
+        scores[ColumnarTranspositionCipher] = transposition * (1 - unstripped)
+
+        total = sum(score + EPSILON for score in scores.values())
+        ranked = [(cipher, (score + EPSILON) / total) for cipher, score in scores.items()]
+        return sorted(ranked, key=lambda item: -item[1])
+
+
+if __name__ == "__main__":
+    plain = "As a student interested in security and cryptographic algorithms, studying and implementing " \
+            "various algorithms proved to be a challenge and great learning experience. Reading about the " \
+            "different weaknesses each have on how to decrypt them was especially fascinating. " * 3
+    for cipher, key in ((CaesarCipher(), 11), (ViginereCipher(), "sushi"), (PlayfairCipher(), "monarchy"),
+                        (TranspositionCipher(), None), (ColumnarTranspositionCipher(), "zebra")):
+        ranks = CipherClassifier().rank(cipher.encrypt(plain, key))
+        print(type(cipher).__name__, "->", ", ".join("%s %.2f" % (c.__name__, p) for c, p in ranks[:2]))
@@ -0,0 +1,123 @@
+#
+# CS106 Final Project
+# CryptWing
+#
+# command line batch runner
+#
+# Shion Fukuzawa (sf27)
+# December 15, 2016
+#
+# This file runs the ciphers over many files at once without the GUI, spreading the files over
+# a pool of worker processes. It must never import tkinter, so it can run on machines without a display.
+#
+# Usage:
+#   python3 cli.py caesar -k 17 letters/ notes.txt
+#   python3 cli.py viginere -k mindblown --decrypt --workers 4 letters/
+#
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bulk import BULK_CIPHERS, bulk_process
+from classical_ciphers import CIPHER_NAMES
+
+
+def find_files(paths, suffix, pattern_ext):
+    """
+    Expands the given paths into a list of input files. Directories are searched recursively for files
+    ending in pattern_ext, and files that are already outputs (ending in suffix) are skipped.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.endswith(pattern_ext) and not name.endswith(suffix):
+                        files.append(os.path.join(root, name))
+        else:
+            files.append(path)
+    return files
+
+
+def process_file(cipher_name, key, in_path, out_path, decrypt, bulk):
+    """
+    Runs in a worker process. Encrypts or decrypts one file.
+    :param bulk: Use the memory mapped bulk mode when the cipher supports it
+    :return: (in_path, out_path, bytes processed, seconds taken)
+    """
+    cipher = CIPHER_NAMES[cipher_name]()
+    start = time.perf_counter()
+    if bulk and isinstance(cipher, BULK_CIPHERS):
+        bulk_process(cipher, in_path, out_path, key, decrypt=decrypt)
+    elif decrypt:
+        cipher.decrypt_file(in_path, out_path, key)
+    else:
+        cipher.encrypt_file(in_path, out_path, key)
+    return in_path, out_path, os.path.getsize(in_path), time.perf_counter() - start
+
+
+def format_rate(size, seconds):
+    """
+    :return: Throughput as a readable string
+    """
+    return "%.2f MB in %.3f s (%.2f MB/s)" % (size / 1e6, seconds, size / 1e6 / max(seconds, 1e-9))
+
+
+def run(cipher_name, key, files, suffix, decrypt=False, workers=None, bulk=False, out=sys.stdout):
+    """
+    Processes every file with a pool of [workers] processes, writing each output next to its input.
+    Prints the throughput of every file and the total.
+    :return: The number of files that failed
+    """
+    failures = 0
+    total_size = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for path in files:
+            future = pool.submit(process_file, cipher_name, key, path, path + suffix, decrypt, bulk)
+            futures[future] = path
+        for future in as_completed(futures):
+            try:
+                in_path, out_path, size, seconds = future.result()
+            except (OSError, ValueError, TypeError) as error:
+                failures += 1
+                print("FAILED %s: %s" % (futures[future], error), file=out)
+                continue
+            total_size += size
+            print("%s -> %s: %s" % (in_path, out_path, format_rate(size, seconds)), file=out)
+
+    print("TOTAL %d files: %s" % (len(files) - failures, format_rate(total_size, time.perf_counter() - start)),
+          file=out)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Encrypt or decrypt files with the CryptWing ciphers.")
+    parser.add_argument("cipher", choices=sorted(CIPHER_NAMES), help="cipher to use")
+    parser.add_argument("paths", nargs="+", help="files, or directories to search for files")
+    parser.add_argument("-k", "--key", help="cipher key (the transposition cipher does not need one)")
+    parser.add_argument("-d", "--decrypt", action="store_true", help="decrypt instead of encrypting")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("-s", "--suffix", help="appended to each input path to name its output "
+                                               "(default .enc, or .dec when decrypting)")
+    parser.add_argument("--ext", default=".txt", help="file extension to look for in directories (default .txt)")
+    parser.add_argument("--bulk", action="store_true", help="use the memory mapped bulk mode where possible")
+    args = parser.parse_args(argv)
+
+    suffix = args.suffix or (".dec" if args.decrypt else ".enc")
+    files = find_files(args.paths, suffix, args.ext)
+    if not files:
+        parser.error("no input files found")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    failures = run(args.cipher, args.key, files, suffix, args.decrypt, args.workers, args.bulk)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+#
+# CS106 Final Project
+# CryptWing
+#
+# cracker
+#
+# Shion Fukuzawa (sf27)
+# December 15, 2016
+#
+# This file recovers the keys of the ciphers whose weakness is their letter frequencies.
+#
+# Algorithms referenced from
+#    http://practicalcryptography.com/cryptanalysis/
+#
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from analyzer import ENGLISH_FREQUENCIES, LETTER_INDEX, letter_histogram
+from classical_ciphers import CaesarCipher, ViginereCipher, text_to_codes
+
+# How much the average column IoC of a length rises by chance, times letters / length
+IOC_NOISE = 0.35
+
+
+def shift_scores(counts):
+    """
+    Scores every caesar shift against English with the chi-squared statistic, by rotating the expected
+    English histogram instead of decrypting the text 26 times. Lower is better.
+    Under shift s, the plain letter i shows up as the cipher letter (i + s) % 26.
+    :param counts: The 26 letter counts of the cipher text
+    :return: List of the 26 chi-squared scores, indexed by shift
+    """
+    total = sum(int(n) for n in counts)
+    if total == 0:
+        return [0.0] * 26
+
+    if np is not None:
+        observed = np.asarray(counts, dtype=np.float64)
+        # rotation[s, j] is the plain letter that cipher letter j came from under shift s
+        rotation = (np.arange(26)[None, :] - np.arange(26)[:, None]) % 26
+        expected = total * np.asarray(ENGLISH_FREQUENCIES)[rotation]
+        return (((observed - expected) ** 2) / expected).sum(axis=1).tolist()
+
+    scores = []
+    for shift in range(26):
+        score = 0.0
+        for letter in range(26):
+            expected = total * ENGLISH_FREQUENCIES[(letter - shift) % 26]
+            score += (int(counts[letter]) - expected) ** 2 / expected
+        scores.append(score)
+    return scores
+
+
+def rank_shifts(counts):
+    """
+    :return: List of (shift, chi-squared score) for all 26 shifts, best first
+    """
+    scores = shift_scores(counts)
+    return sorted(enumerate(scores), key=lambda item: item[1])
+
+
+class CaesarSolver:
+    """
+    Breaks the caesar cipher without knowing the key.
+    The letter histogram of the cipher text is built in one pass, then every shift is scored against the
+    English letter frequencies by rotating that histogram, so the cost of trying all 26 keys does not depend
+    on the length of the text. Only the winning key is used to decrypt.
+    """
+
+    def __init__(self):
+        self.caesar = CaesarCipher()
+
+    def rank(self, text):
+        """
+        :return: List of (key, chi-squared score) for every key, most likely first. A key here is what
+                 CaesarCipher.decrypt needs to recover the text.
+        """
+        return rank_shifts(letter_histogram(text))
+
+    def solve(self, text):
+        """
+        Finds the most likely key and decrypts the text with it.
+        :return: (key, decrypted text)
+        """
+        key, _ = self.rank(text)[0]
+        return key, self.caesar.decrypt(text, key)
+
+
+def position_letters(text):
+    """
+    Converts every character of the text to 0 ~ 25 if it is a letter (case folded) and 26 otherwise.
+    Unlike analyzer.letter_indices, non-letters keep their place, because they still use up a position
+    of the Viginere key.
+    :return: Array (list without NumPy) with one value per character
+    """
+    if np is not None:
+        codes, _ = text_to_codes(text)
+        folded = (codes | 32) - codes.dtype.type(97)
+        return np.where(folded < 26, folded, 26).astype(np.int32)
+    return [LETTER_INDEX.get(c, 26) for c in text]
+
+
+def column_histograms(values, period):
+    """
+    Splits the text into [period] columns (position % period) and counts the letters of each.
+    With NumPy, the text is viewed as a (rows, period) grid without copying, and all columns are counted
+    by a single bincount.
+    :param values: Output of position_letters
+    :return: List of [period] lists of 26 letter counts
+    """
+    if np is None:
+        histograms = []
+        for column in range(period):
+            counts = [0] * 27
+            for value in values[column::period]:
+                counts[value] += 1
+            histograms.append(counts[:26])
+        return histograms
+
+    full = len(values) - len(values) % period
+    grid = values[:full].reshape(-1, period)
+    offsets = np.arange(period, dtype=np.int32) * 27
+    counts = np.bincount((grid + offsets).ravel(), minlength=27 * period)
+    counts += np.bincount(values[full:] + offsets[:len(values) - full], minlength=27 * period)
+    return counts.reshape(period, 27)[:, :26].tolist()
+
+
+def average_ioc(histograms):
+    """
+    :return: The index of coincidence of each column, averaged over the columns with at least 2 letters
+    """
+    iocs = []
+    for counts in histograms:
+        total = sum(counts)
+        if total >= 2:
+            iocs.append(sum(n * (n - 1) for n in counts) / (total * (total - 1)))
+    return sum(iocs) / len(iocs) if iocs else 0.0
+
+
+def kasiski_scores(values, max_period, sample=1 << 18):
+    """
+    Kasiski examination: repeated trigrams tend to be a multiple of the key length apart.
+    Looks at the first [sample] characters only, since repeats are plentiful.
+    :return: Dictionary of period -> how much more often than chance the repeat distances are multiples of it
+    """
+    values = values[:sample]
+    positions = {}
+    distances = []
+    for i in range(len(values) - 2):
+        a, b, c = int(values[i]), int(values[i + 1]), int(values[i + 2])
+        if a < 26 and b < 26 and c < 26:
+            trigram = (a * 26 + b) * 26 + c
+            if trigram in positions:
+                distances.append(i - positions[trigram])
+            positions[trigram] = i
+
+    scores = {}
+    for period in range(1, max_period + 1):
+        if distances:
+            scores[period] = period * sum(1 for d in distances if d % period == 0) / len(distances)
+        else:
+            scores[period] = 0.0
+    return scores
+
+
+class VigenereSolver:
+    """
+    Breaks the Viginere cipher without knowing the key.
+        1. For every candidate key length, the text is split into columns and the average index of
+           coincidence of the columns is computed. At the true length (or a multiple of it) every column is
+           a caesar cipher, so its IoC is close to English instead of random.
+        2. Optionally, the Kasiski examination votes for lengths too.
+        3. Each column of the best lengths is solved as a caesar cipher from its histogram.
+    """
+
+    def __init__(self, max_period=20, early_stop_ioc=0.06, kasiski=False):
+        """
+        :param max_period: Longest key length to try
+        :param early_stop_ioc: Stop trying longer keys once a length reaches this IoC, apart from its multiples
+                               (a key like "banana" first reaches it at a divisor of its length). None tries
+                               them all.
+        :param kasiski: Also rank lengths by the Kasiski examination
+        """
+        self.max_period = max_period
+        self.early_stop_ioc = early_stop_ioc
+        self.kasiski = kasiski
+
+    def key_lengths(self, text):
+        """
+        :return: List of (key length, average column IoC), most likely first
+        """
+        return self.key_lengths_and_histograms(position_letters(text))[0]
+
+    def key_lengths_and_histograms(self, values):
+        """
+        :return: (ranked list of (length, IoC), dictionary of length -> column histograms)
+        """
+        iocs = {}
+        histograms = {}
+        longest = min(self.max_period, max(len(values), 1))
+        for period in range(1, longest + 1):
+            histograms[period] = column_histograms(values, period)
+            iocs[period] = average_ioc(histograms[period])
+            if self.early_stop_ioc is not None and iocs[period] >= self.early_stop_ioc:
+                # A key made of a repeated pattern already looks solved at the length of the pattern, so
+                # its multiples are tried too, and the ranking below takes one that is clearly better
+                for multiple in range(2 * period, longest + 1, period):
+                    histograms[multiple] = column_histograms(values, multiple)
+                    iocs[multiple] = average_ioc(histograms[multiple])
+                break
+
+        # A multiple of the key length scores as well as the length itself, so prefer the shortest length
+        # that explains it: one whose key, repeated, is the key found at the multiple, or whose IoC is not
+        # clearly lower. The IoC of longer lengths is noisier, as their columns hold fewer letters. A repeated
+        # pattern key ("banana") has a clearly higher IoC than its pattern ("na") once the text is long enough.
+        letters = max(sum(sum(counts) for counts in histograms[1]), 1)
+        keys = {}
+
+        def key_of(period):
+            if period not in keys:
+                keys[period] = self.solve_columns(histograms[period])
+            return keys[period]
+
+        def explained(period):
+            margin = max(IOC_NOISE * period / letters, 0.002)
+            return any(period % q == 0 and (iocs[period] - iocs[q] < margin
+                                            or key_of(q) * (period // q) == key_of(period))
+                       for q in iocs if q < period)
+
+        ranked = sorted(iocs, key=lambda period: (explained(period), -iocs[period]))
+        if self.kasiski:
+            kasiski = kasiski_scores(values, max(iocs))
+            by_kasiski = sorted(iocs, key=lambda period: -kasiski[period])
+            # Borda count of the two rankings, ties going to the IoC ranking
+            ioc_place = {period: place for place, period in enumerate(ranked)}
+            ranked = sorted(ranked, key=lambda period: ioc_place[period] + by_kasiski.index(period))
+        return [(period, iocs[period]) for period in ranked], histograms
+
+    def solve_columns(self, histograms):
+        """
+        Solves each column as a caesar cipher.
+        :return: The key, as letters
+        """
+        return "".join(chr(97 + rank_shifts(counts)[0][0]) for counts in histograms)
+
+    def rank(self, text, candidates=3):
+        """
+        :param candidates: How many key lengths to recover keys for
+        :return: List of (key, key length, IoC), most likely first. Each key can be passed straight to
+                 ViginereCipher.decrypt.
+        """
+        lengths, histograms = self.key_lengths_and_histograms(position_letters(text))
+        return [(self.solve_columns(histograms[period]), period, ioc) for period, ioc in lengths[:candidates]]
+
+    def solve(self, text):
+        """
+        Recovers the most likely key and decrypts the text with it.
+        :return: (key, decrypted text)
+        """
+        ranks = self.rank(text, candidates=1)
+        if not ranks:
+            return "", text
+        key = ranks[0][0]
+        return key, ViginereCipher().decrypt(text, key)
+
+
+if __name__ == "__main__":
+    secret = CaesarCipher().encrypt("Reading about the different weaknesses each cipher has was fascinating", 11)
+    print("CAESAR ranks:", CaesarSolver().rank(secret)[:3])  # Key 11 first
+    print("CAESAR solve:", CaesarSolver().solve(secret))
+
+    plain = "As a student interested in security and cryptographic algorithms, studying and implementing " \
+            "various algorithms proved to be a challenge and great learning experience. Reading about the " \
+            "different weaknesses each have on how to decrypt them was especially fascinating. " * 3
+    secret = ViginereCipher().encrypt(plain, "sushi")
+    print("VIGINERE ranks:", VigenereSolver().rank(secret))  # sushi first
+
+    # Keys made of a repeated pattern, which reach the early stop IoC at the length of the pattern
+    from fitness import ENGLISH_CORPUS
+    with open(ENGLISH_CORPUS) as corpus:
+        plain = corpus.read(3000)
+    for key in ("banana", "papaya", "tomtomtim", "zigzagzig", "abcabd"):
+        found, _ = VigenereSolver().solve(ViginereCipher().encrypt(plain, key))
+        assert found == key, (key, found)
+    print("VIGINERE repeated pattern keys: ok")
@@ -0,0 +1,193 @@
+#
+# CS106 Final Project
+# CryptWing
+#
+# fitness
+#
+# Shion Fukuzawa (sf27)
+# December 15, 2016
+#
+# This file measures how much a piece of text looks like English, by the log probability of its quadgrams
+# (groups of four letters) in a sample of English text.
+#
+# Algorithms referenced from
+#    http://practicalcryptography.com/cryptanalysis/text-characterisation/quadgrams/
+#
+
+import math
+import mmap
+import os
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from analyzer import count_ngrams, letter_indices
+
+# Sample of English text the quadgram counts are taken from
+ENGLISH_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "english_sample.txt")
+
+# The quadgram table of the sample, generated from it the first time it is needed (not kept in git)
+QUADGRAM_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "english_quadgrams.f32")
+
+QUADGRAMS = 26 ** 4
+
+
+def quadgram_log_probabilities(counts):
+    """
+    Turns quadgram counts into log10 probabilities. Quadgrams that were never seen get a floor a hundred
+    times less likely than one that was seen once, so a single rare quadgram cannot sink a whole text.
+    :param counts: Flat array of the 26 ** 4 quadgram counts, as made by analyzer.count_ngrams
+    :return: float32 array (array('f') without NumPy) of 26 ** 4 log probabilities
+    """
+    total = max(int(sum(int(n) for n in counts)), 1)
+    floor = math.log10(0.01 / total)
+    if np is not None:
+        counts = np.asarray(counts, dtype=np.float64)
+        table = np.full(len(counts), floor)
+        seen = counts > 0
+        table[seen] = np.log10(counts[seen] / total)
+        return table.astype(np.float32)
+    return array('f', (math.log10(n / total) if n else floor for n in counts))
+
+
+def build_quadgram_table(corpus=ENGLISH_CORPUS, path=QUADGRAM_TABLE):
+    """
+    Counts the quadgrams of the corpus and saves their log probabilities to path, as 26 ** 4 float32 values
+    in native byte order. The file is written under a temporary name first, so other processes never map
+    a half written table.
+    """
+    with open(corpus, encoding="utf-8") as file:
+        table = quadgram_log_probabilities(count_ngrams(letter_indices(file.read()), 4))
+    temporary = "%s.%d.tmp" % (path, os.getpid())
+    with open(temporary, "wb") as file:
+        file.write(table.tobytes())
+    os.replace(temporary, path)
+
+
+def map_quadgram_table(path=QUADGRAM_TABLE):
+    """
+    Memory maps a table saved by build_quadgram_table. Nothing is read until a quadgram is looked up, and
+    every process that maps the file shares the same pages.
+    :return: (mmap, table), where table is a read only float32 view of the mapping: a NumPy array, or a
+             memoryview cast to floats without NumPy
+    """
+    with open(path, "rb") as file:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(mapping) != QUADGRAMS * 4:
+        mapping.close()
+        raise ValueError("%s is not a quadgram table" % path)
+    if np is not None:
+        return mapping, np.frombuffer(mapping, dtype=np.float32)
+    return mapping, memoryview(mapping).cast('f')
+
+
+class QuadgramScorer:
+    """
+    Scores letters by the sum of the log10 probabilities of their quadgrams. English text scores much higher
+    than random or wrongly decrypted letters, which is what a key search needs to climb towards.
+        table: Dense float32 log probability of every quadgram, (a, b, c, d) at a * 17576 + b * 676 + c * 26 + d.
+               A NumPy array, or anything indexable by position (array('f'), memoryview) without NumPy.
+        mapping: The memory map behind the table, if it came from a file
+    """
+
+    def __init__(self, table, mapping=None):
+        self.table = table
+        self.mapping = mapping
+
+    @classmethod
+    def from_counts(cls, counts):
+        """
+        :param counts: Flat array of the 26 ** 4 quadgram counts, as made by analyzer.count_ngrams
+        """
+        return cls(quadgram_log_probabilities(counts))
+
+    @classmethod
+    def from_text(cls, text):
+        """
+        Counts the quadgrams of a sample of English text.
+        """
+        return cls.from_counts(count_ngrams(letter_indices(text), 4))
+
+    @classmethod
+    def from_file(cls, path=QUADGRAM_TABLE):
+        """
+        Maps a table saved by build_quadgram_table.
+        """
+        mapping, table = map_quadgram_table(path)
+        return cls(table, mapping)
+
+    @property
+    def floor(self):
+        """
+        The log probability of a quadgram that never appeared in the sample
+        """
+        if np is not None and isinstance(self.table, np.ndarray):
+            return float(self.table.min())
+        return float(min(self.table))
+
+    def score_indices(self, indices):
+        """
+        :param indices: Letters as 0 ~ 25. A NumPy integer array is scored without a Python loop.
+        :return: Sum of the log probabilities of every quadgram
+        """
+        if len(indices) < 4:
+            return 0.0
+        if np is not None and isinstance(indices, np.ndarray):
+            # The window of each position is the base-26 number of its 4 letters, built from shifted views
+            indices = np.asarray(indices, dtype=np.int64)
+            quadgrams = ((indices[:-3] * 26 + indices[1:-2]) * 26 + indices[2:-1]) * 26 + indices[3:]
+            return float(self.table[quadgrams].sum(dtype=np.float64))
+
+        table = self.table
+        score = 0.0
+        quadgram = (indices[0] * 26 + indices[1]) * 26 + indices[2]
+        for letter in indices[3:]:
+            quadgram = (quadgram % 17576) * 26 + letter
+            score += table[quadgram]
+        return float(score)
+
+    def score(self, text):
+        """
+        :return: Sum of the log probabilities of the quadgrams of the letters of the text
+        """
+        return self.score_indices(letter_indices(text))
+
+    def fitness(self, text):
+        """
+        :return: Average log probability per quadgram, so texts of different lengths can be compared.
+                 English scores around -4.5 here; random letters score close to the floor.
+        """
+        quadgrams = len(letter_indices(text)) - 3
+        return self.score(text) / quadgrams if quadgrams > 0 else self.floor
+
+
+# Mapped the first time it is needed
+_ENGLISH = None
+
+
+def english_scorer():
+    """
+    :return: The QuadgramScorer of the English sample, shared by everything in this process.
+             The table file is (re)built from the sample when it is missing or older than the sample; if it
+             cannot be written, the table is kept in memory instead.
+    """
+    global _ENGLISH
+    if _ENGLISH is None:
+        try:
+            if not os.path.exists(QUADGRAM_TABLE) or \
+                    os.path.getmtime(QUADGRAM_TABLE) < os.path.getmtime(ENGLISH_CORPUS):
+                build_quadgram_table()
+            _ENGLISH = QuadgramScorer.from_file()
+        except (OSError, ValueError):
+            with open(ENGLISH_CORPUS, encoding="utf-8") as file:
+                _ENGLISH = QuadgramScorer.from_text(file.read())
+    return _ENGLISH
+
+
+if __name__ == "__main__":
+    scorer = english_scorer()
+    print(scorer.fitness("The quick brown fox jumps over the lazy dog"))
+    print(scorer.fitness("Xkq vgzwp nrbjf lmqd tuyhs ovcz qqpl xkzw"))
@@ -0,0 +1,338 @@
+#
+# CS106 Final Project
+# CryptWing
+#
+# instrumentation
+#
+# Shion Fukuzawa (sf27)
+# December 15, 2016
+#
+# This file counts what the ciphers do: how often each method is called, how many characters go through
+# it, how the time splits between preparing keys and processing text, and how often the key schedule
+# cache saves a rebuild. It is off by default. Turning it on wraps the methods of every cipher class, and
+# turning it off puts the original methods back, so a disabled layer costs nothing at all.
+#
+
+import cProfile
+import io
+import pstats
+import threading
+import time
+from functools import wraps
+
+# Method name -> what the method does. 'process' methods turn text into text, 'key' methods prepare a key
+# (including the cache lookup), and 'build' methods are only reached on a key schedule cache miss. 'derive'
+# methods build key material for each text that is never cached (eg. the columnar permutation), so every
+# call counts as a key lookup and a build. 'stream' methods return a stream, whose chunks are counted as
+# they go through it (see CountedStream), so files, jobs and bulk mode are counted too.
+INSTRUMENTED_METHODS = {
+    'encrypt': 'process',
+    'decrypt': 'process',
+    'encrypt_many': 'process',
+    'decrypt_many': 'process',
+    'encrypt_bytes': 'process',
+    'decrypt_bytes': 'process',
+    'key_schedule': 'key',
+    'build_key_schedule': 'build',
+    'permutation': 'derive',
+    'stream_encryptor': 'stream',
+    'stream_decryptor': 'stream',
+}
+
+# Stream method name -> name the chunks going through its streams are counted under
+STREAM_NAMES = {
+    'stream_encryptor': 'encrypt_stream',
+    'stream_decryptor': 'decrypt_stream',
+}
+
+
+def text_length(args, kwargs):
+    """
+    :return: Number of characters (or bytes) in the text argument of a process method (the first one), added
+             up when it is a list of texts. 0 if there is none.
+    """
+    text = args[0] if args else kwargs.get('text', kwargs.get('plain_text', kwargs.get('data')))
+    if isinstance(text, (list, tuple)):
+        return sum(len(item) for item in text if isinstance(item, (str, bytes, bytearray)))
+    try:
+        return len(text)
+    except TypeError:
+        return 0
+
+
+class CipherCounters:
+    """
+    What one cipher class has done since the counters were last reset.
+        calls: Method name -> number of calls. For streams (eg. 'encrypt_stream'), the number of chunks.
+        chars: Process method or stream name -> characters passed in (bytes, for ASCII text)
+        key_seconds: Time spent preparing keys, whether or not the cache had them
+        process_seconds: Time spent in process methods, not counting the key preparation inside them
+        key_lookups: Keys asked for
+        key_builds: Keys that were not cached and had to be built
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.chars = {}
+        self.key_seconds = 0.0
+        self.process_seconds = 0.0
+        self.key_lookups = 0
+        self.key_builds = 0
+
+    def as_dict(self):
+        """
+        :return: The counters as a dictionary, with the cache hit rate and throughput worked out
+        """
+        chars = sum(self.chars.values())
+        return {
+            'calls': dict(self.calls),
+            'chars': dict(self.chars),
+            'key_seconds': self.key_seconds,
+            'process_seconds': self.process_seconds,
+            'key_lookups': self.key_lookups,
+            'key_builds': self.key_builds,
+            'key_hit_rate': 1 - self.key_builds / self.key_lookups if self.key_lookups else 0.0,
+            'mb_s': chars / 1e6 / self.process_seconds if self.process_seconds else 0.0,
+        }
+
+
+class Frame:
+    """
+    A process method call in progress, collecting the key preparation time spent inside it.
+    """
+
+    def __init__(self, cipher):
+        self.cipher = cipher
+        self.key_seconds = 0.0
+
+
+class CountedStream:
+    """
+    Wraps a stream made by an instrumented stream method, counting the characters and time of every chunk
+    (see Instrumentation.measure). Anything else is passed through to the stream.
+    """
+
+    def __init__(self, instrumentation, cipher, stream, name):
+        self.instrumentation = instrumentation
+        self.cipher = cipher
+        self.stream = stream
+        self.name = name
+
+    def update(self, chunk):
+        return self.instrumentation.measure(self.cipher, self.name, len(chunk), self.stream.update, chunk)
+
+    def finish(self):
+        outputs = iter(self.stream.finish())
+        while True:
+            try:
+                out = self.instrumentation.measure(self.cipher, self.name, 0, next, outputs)
+            except StopIteration:
+                return
+            yield out
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class Instrumentation:
+    """
+    Registry of the cipher classes, and the switch that wraps their methods.
+    Every Cipher subclass registers itself when it is defined (see Cipher.__init_subclass__), so classes
+    defined after enable() are wrapped as well.
+    """
+
+    def __init__(self):
+        self.classes = []
+        self.originals = {}
+        self.counters = {}
+        self.enabled = False
+        self.profiler = None
+        self.profiling = False
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def register(self, cls):
+        """
+        Adds a cipher class, wrapping its methods right away if the layer is on.
+        """
+        self.classes.append(cls)
+        if self.enabled:
+            self.wrap_class(cls)
+
+    def enable(self, profile=False):
+        """
+        Starts counting.
+        :param profile: Also run cProfile during the outermost process method calls (on one thread at a
+                        time), so the hot path can be inspected with profile_report()
+        """
+        if profile and self.profiler is None:
+            self.profiler = cProfile.Profile()
+        if not self.enabled:
+            self.enabled = True
+            for cls in self.classes:
+                self.wrap_class(cls)
+
+    def disable(self):
+        """
+        Stops counting and puts every original method back. The counters are kept until reset().
+        """
+        self.enabled = False
+        for (cls, name), original in self.originals.items():
+            setattr(cls, name, original)
+        self.originals.clear()
+
+    def reset(self):
+        """
+        Clears the counters and the profile.
+        """
+        with self.lock:
+            self.counters.clear()
+            if self.profiler is not None:
+                self.profiler = cProfile.Profile()
+
+    def wrap_class(self, cls):
+        """
+        Wraps the instrumented methods that cls defines itself. Inherited methods are already wrapped on
+        the class that defines them, and count towards the class of the instance they are called on.
+        """
+        for name, kind in INSTRUMENTED_METHODS.items():
+            if name in cls.__dict__ and (cls, name) not in self.originals:
+                original = cls.__dict__[name]
+                self.originals[(cls, name)] = original
+                setattr(cls, name, self.wrap(original, name, kind))
+
+    def counters_of(self, cipher):
+        counters = self.counters.get(type(cipher).__name__)
+        if counters is None:
+            counters = self.counters.setdefault(type(cipher).__name__, CipherCounters())
+        return counters
+
+    def wrap(self, method, name, kind):
+        """
+        :return: A function that calls method and records the call in the counters of its cipher
+        """
+        instrumentation = self
+
+        @wraps(method)
+        def wrapper(cipher, *args, **kwargs):
+            frames = instrumentation.frames()
+
+            if kind == 'build':
+                with instrumentation.lock:
+                    counters = instrumentation.counters_of(cipher)
+                    counters.calls[name] = counters.calls.get(name, 0) + 1
+                    counters.key_builds += 1
+                return method(cipher, *args, **kwargs)
+
+            if kind in ('key', 'derive'):
+                start = time.perf_counter()
+                try:
+                    return method(cipher, *args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - start
+                    if frames:
+                        frames[-1].key_seconds += elapsed
+                    with instrumentation.lock:
+                        counters = instrumentation.counters_of(cipher)
+                        counters.calls[name] = counters.calls.get(name, 0) + 1
+                        counters.key_lookups += 1
+                        counters.key_seconds += elapsed
+                        if kind == 'derive':
+                            counters.key_builds += 1
+
+            if kind == 'stream':
+                # A stream made inside a process call of the same cipher is part of that call
+                if frames and frames[-1].cipher is cipher:
+                    return method(cipher, *args, **kwargs)
+                stream = instrumentation.measure(cipher, name, 0, method, cipher, *args, **kwargs)
+                return CountedStream(instrumentation, cipher, stream, STREAM_NAMES[name])
+
+            return instrumentation.measure(cipher, name, text_length(args, kwargs), method, cipher, *args, **kwargs)
+
+        return wrapper
+
+    def measure(self, cipher, name, chars, function, *args, **kwargs):
+        """
+        Calls function(*args, **kwargs) as a process call of the cipher: its time, minus the key preparation
+        inside it, and the characters it was given are added to the counters under name.
+        """
+        frames = self.frames()
+        # A process method called from another one on the same cipher (eg. through super()) is part of the
+        # outer call
+        if frames and frames[-1].cipher is cipher:
+            return function(*args, **kwargs)
+
+        profiling = not frames and self.start_profile()
+        frame = Frame(cipher)
+        frames.append(frame)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            frames.pop()
+            if profiling:
+                self.stop_profile()
+            if frames:
+                # Keys prepared inside this call were key time of the outer call too
+                frames[-1].key_seconds += frame.key_seconds
+            with self.lock:
+                counters = self.counters_of(cipher)
+                counters.calls[name] = counters.calls.get(name, 0) + 1
+                counters.chars[name] = counters.chars.get(name, 0) + chars
+                counters.process_seconds += elapsed - frame.key_seconds
+
+    def frames(self):
+        """
+        :return: The process method calls in progress on this thread, innermost last
+        """
+        frames = getattr(self.local, 'frames', None)
+        if frames is None:
+            frames = self.local.frames = []
+        return frames
+
+    def start_profile(self):
+        """
+        Turns the profiler on for this thread, unless there is no profiler or another thread is using it.
+        :return: Whether the profiler was turned on
+        """
+        with self.lock:
+            if self.profiler is None or self.profiling:
+                return False
+            self.profiling = True
+        self.profiler.enable()
+        return True
+
+    def stop_profile(self):
+        self.profiler.disable()
+        with self.lock:
+            self.profiling = False
+
+    def stats(self, cls=None):
+        """
+        :param cls: A cipher class to report on, or None for all of them
+        :return: Dictionary of cipher class name -> counters (see CipherCounters.as_dict), or the counters of
+                 cls alone
+        """
+        with self.lock:
+            if cls is not None:
+                return self.counters.get(cls.__name__, CipherCounters()).as_dict()
+            return {name: counters.as_dict() for name, counters in sorted(self.counters.items())}
+
+    def profile_report(self, sort='cumulative', limit=20):
+        """
+        :return: The cProfile table of the profiled calls, as text. Empty if profiling was never enabled.
+        """
+        if self.profiler is None:
+            return ""
+        out = io.StringIO()
+        with self.lock:
+            try:
+                pstats.Stats(self.profiler, stream=out).sort_stats(sort).print_stats(limit)
+            except TypeError:  # Nothing has been profiled yet
+                return ""
+        return out.getvalue()
+
+
+# Shared by every cipher class
+INSTRUMENTATION = Instrumentation()
@@ -0,0 +1,196 @@
+#
+# CS106 Final Project
+# CryptWing
+#
+# background jobs
+#
+# Shion Fukuzawa (sf27)
+# December 15, 2016
+#
+# This file runs the long cipher and analysis work of the GUI on a worker thread, one chunk at a time,
+# so the window keeps responding, can show how far along a job is, and can cancel it between chunks.
+# It does not import tkinter; the GUI polls the jobs with after().
+#
+
+import os
+import threading
+
+from analyzer import Analyzer
+from cipher import CHUNK_SIZE, read_chunks
+from classifier import CipherClassifier
+from cracker import VigenereSolver, rank_shifts
+from result_cache import result_digest
+
+# How far the progress of a cipher job gets once all of its input is read. The rest is left for the
+# stream's finish(), where the buffered ciphers (columnar, transposition decryption) do all of their work.
+INPUT_PROGRESS = 0.9
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job, between two chunks, once the job has been cancelled.
+    """
+    pass
+
+
+class Job:
+    """
+    Runs target(job, *args, **kwargs) on a worker thread.
+        progress: Fraction of the work done so far (0 ~ 1), updated by the target through report()
+        status: What the target is doing now, for the GUI to show, or None
+        result: What the target returned, once it is done
+        error: The exception the target raised, if it failed
+        cancelled: Whether the target stopped because the job was cancelled
+    The target calls check() (or iterates its chunks through track(), which does) to notice a cancel.
+    """
+
+    def __init__(self, target, *args, **kwargs):
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs
+        self.progress = 0.0
+        self.status = None
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        """
+        :return: The job itself
+        """
+        self.thread.start()
+        return self
+
+    def run(self):
+        try:
+            self.result = self.target(self, *self.args, **self.kwargs)
+            self.progress = 1.0
+        except JobCancelled:
+            self.cancelled = True
+        except Exception as error:  # Handed to the GUI, which shows it instead of the result
+            self.error = error
+
+    def done(self):
+        """
+        :return: True once the target has returned, failed or been cancelled
+        """
+        return not self.thread.is_alive()
+
+    def cancel(self):
+        """
+        Asks the job to stop at the end of the chunk it is working on.
+        """
+        self.stop.set()
+
+    def check(self):
+        """
+        Raises JobCancelled if the job has been cancelled.
+        """
+        if self.stop.is_set():
+            raise JobCancelled()
+
+    def report(self, done, total, start=0.0, end=1.0):
+        """
+        Sets the progress to [done] out of [total], scaled into the part [start, end] of the whole job.
+        """
+        fraction = min(done / total, 1.0) if total else 1.0
+        self.progress = start + (end - start) * fraction
+
+    def track(self, chunks, total, start=0.0, end=1.0):
+        """
+        Passes the chunks through, checking for a cancel before each one and reporting the progress after.
+        :param total: The combined length of all chunks
+        :return: Generator of the same chunks
+        """
+        done = 0
+        for chunk in chunks:
+            self.check()
+            yield chunk
+            done += len(chunk)
+            self.report(done, total, start, end)
+
+
+def text_chunks(text, chunk_size=CHUNK_SIZE):
+    """
+    :return: Generator of consecutive slices of the text, each at most chunk_size characters long
+    """
+    for start in range(0, len(text), chunk_size):
+        yield text[start:start + chunk_size]
+
+
+def read_job(job, path, chunk_size=CHUNK_SIZE):
+    """
+    Reads a whole text file.
+    Progress is counted in characters against the size of the file in bytes, so it is exact for ASCII files.
+    :return: The contents of the file
+    """
+    return "".join(job.track(read_chunks(path, chunk_size), os.path.getsize(path)))
+
+
+def cipher_job(job, cipher, key, decrypt=False, text=None, path=None, strip_whitespace=False,
+               chunk_size=CHUNK_SIZE, cache=None):
+    """
+    Encrypts or decrypts a text, or the contents of a file, through the stream of the cipher.
+    :param text: The text to process, when path is not given
+    :param path: A file to process chunk by chunk instead, without reading it all in first
+    :param strip_whitespace: Remove all whitespace from the input first, as the encrypt page does
+    :param cache: A ResultCache to look the result up in first, and to keep it in. The input is hashed in
+                  a first pass, so a file is read twice when the result is not cached.
+    :return: The result as a string. An invalid key raises ValueError with the cipher's message.
+             Progress stops at INPUT_PROGRESS once the input is read, and the job is checked for a cancel
+             between the chunks finish() gives.
+    """
+    def input_chunks(start, end):
+        if path is not None:
+            chunks = job.track(read_chunks(path, chunk_size), os.path.getsize(path), start, end)
+        else:
+            chunks = job.track(text_chunks(text, chunk_size), len(text), start, end)
+        if strip_whitespace:
+            chunks = ("".join(chunk.split()) for chunk in chunks)
+        return chunks
+
+    if decrypt:
+        stream = cipher.stream_decryptor(key)
+    else:
+        stream = cipher.stream_encryptor(key)
+
+    start = 0.0
+    if cache is not None:
+        # The same digest as cache.run(cipher, 'encrypt', stripped text, key) gives, since a stream
+        # returns what the whole-text method would
+        start = 0.2
+        digest = result_digest(type(cipher).__name__, 'decrypt' if decrypt else 'encrypt', key,
+                               input_chunks(0.0, start))
+        result = cache.get(digest)
+        if result is not None:
+            return result
+
+    out = [stream.update(chunk) for chunk in input_chunks(start, INPUT_PROGRESS)]
+    job.check()
+    job.status = "Finishing..."
+    for chunk in stream.finish():
+        out.append(chunk)
+        job.check()
+    result = "".join(out)
+    if cache is not None:
+        cache.put(digest, result)
+    return result
+
+
+def analyze_job(job, text, chunk_size=CHUNK_SIZE):
+    """
+    Computes everything the analysis tabs show. The cipher is identified from a sample first; the
+    statistics are gathered chunk by chunk; the caesar keys come from their letter histogram, and the
+    Viginere keys from a final pass over the whole text.
+    :return: (TextStats, ranked caesar keys as in CaesarSolver.rank, ranked keys as in VigenereSolver.rank,
+              ranked ciphers as in CipherClassifier.rank)
+    """
+    cipher_ranks = CipherClassifier().rank(text)
+    job.check()
+    stats = Analyzer().analyze_chunks(job.track(text_chunks(text, chunk_size), len(text), end=0.6))
+    caesar_ranks = rank_shifts(stats.unigrams)
+    job.check()
+    vigenere_ranks = VigenereSolver().rank(text)
+    return stats, caesar_ranks, vigenere_ranks, cipher_ranks
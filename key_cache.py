@@ -0,0 +1,105 @@
+#
+# CS106 Final Project
+# CryptWing
+#
+# key schedule cache
+#
+# Shion Fukuzawa (sf27)
+# December 15, 2016
+#
+# This file implements the cache that lets every cipher reuse the key material it has already built.
+#
+
+import threading
+from collections import OrderedDict
+
+
+class KeyScheduleCache:
+    """
+    A bounded, least recently used cache of key schedules.
+    Entries are keyed by (cipher name, key), so that ciphers that are handed the same key over and over
+    (eg. a batch of messages) only build their key square or key list once.
+    Counts the hits and misses so the cache size can be tuned.
+    """
+
+    def __init__(self, maxsize=128):
+        """
+        :param maxsize: The maximum number of schedules to keep. 0 disables caching.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, cipher_name, key, build):
+        """
+        Returns the schedule of the key, building it with build(key) if it is not cached yet.
+        Errors raised by build are passed on, and nothing is cached for that key.
+        :param cipher_name: Name of the cipher the schedule belongs to
+        :param key: The key as given to the cipher. Must be hashable.
+        :param build: Function that turns the key into its schedule
+        """
+        cache_key = (cipher_name, key)
+        with self.lock:
+            if cache_key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(cache_key)
+                return self.entries[cache_key]
+            self.misses += 1
+
+        schedule = build(key)
+
+        with self.lock:
+            self.entries[cache_key] = schedule
+            self.entries.move_to_end(cache_key)
+            self.evict()
+        return schedule
+
+    def evict(self):
+        """
+        Drops the least recently used entries until the cache fits in maxsize.
+        """
+        while len(self.entries) > max(self.maxsize, 0):
+            self.entries.popitem(last=False)
+
+    def resize(self, maxsize):
+        """
+        Changes the size bound, evicting entries if the cache shrinks.
+        """
+        with self.lock:
+            self.maxsize = maxsize
+            self.evict()
+
+    def clear(self):
+        """
+        Empties the cache and resets the counters.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """
+        :return: Dictionary of the hit/miss counters, hit rate and current size
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+            }
+
+
+# Shared by every cipher instance
+KEY_SCHEDULES = KeyScheduleCache()
+
+if __name__ == "__main__":
+    cache = KeyScheduleCache(maxsize=2)
+    for k in ["sushi", "monarchy", "sushi", "hacker", "monarchy"]:
+        cache.get("ViginereCipher", k, lambda key: [ord(c) - 97 for c in key])
+    print(cache.info())  # 1 hit, 4 misses, size 2
@@ -12,13 +12,38 @@
 #
 
 import tkinter as tk
+import tkinter.font as tkfont
 import tkinter.ttk as ttk
 from tkinter import filedialog
-from cipher import Cipher
-from classical_ciphers import TranspositionCipher, CaesarCipher, ViginereCipher, PlayfairCipher
+from classical_ciphers import TranspositionCipher, ColumnarTranspositionCipher, CaesarCipher, ViginereCipher, \
+    PlayfairCipher
+from jobs import Job, analyze_job, cipher_job, read_job
+from preview import PREVIEW_WIDTH, TextWindow
+from result_cache import RESULTS
 
 LARGE_FONT = ("Verdana", 12)
 
+PREVIEW_FONT = ("Courier", 11)
+
+# Milliseconds between two checks on a running job
+POLL_INTERVAL = 50
+
+# Rows moved by one step of the mouse wheel
+WHEEL_ROWS = 3
+
+# The cipher the classifier is at least this sure of is selected in the combobox by Analyze
+IDENTIFY_CONFIDENCE = 0.5
+
+# Combobox name -> cipher class. Each page creates one instance of each and reuses it, while the key
+# material itself is shared through the key schedule cache.
+CIPHERS = {
+    'Transposition Cipher': TranspositionCipher,
+    'Columnar Transposition Cipher': ColumnarTranspositionCipher,
+    'Caesar Cipher': CaesarCipher,
+    'Viginere Cipher': ViginereCipher,
+    'Playfair Cipher': PlayfairCipher,
+}
+
 
 class CryptWing(tk.Tk):
     """
@@ -64,6 +89,191 @@ class CryptWing(tk.Tk):
         frame.tkraise()
 
 
+class JobPanel(tk.Frame):
+    """
+    Progress bar, status and Cancel button for the long running jobs of a page.
+    A job runs on a worker thread (see jobs.py) while the panel polls it with after(), so the window keeps
+    responding. Once the job is over, it is handed to a callback on the Tk thread, which is the only place
+    widgets may be changed from.
+    """
+    def __init__(self, parent):
+        tk.Frame.__init__(self, parent)
+        self.job = None
+        self.on_done = None
+
+        self.progress_bar = ttk.Progressbar(self, mode='determinate', maximum=1.0)
+        self.status_label = tk.Label(self, text="", width=24, anchor='w')
+        self.cancel_button = tk.Button(self, text="Cancel", command=self.cancel, state='disabled')
+
+        self.progress_bar.pack(side='left', fill='x', expand=True)
+        self.status_label.pack(side='left')
+        self.cancel_button.pack(side='left')
+
+    def busy(self):
+        """
+        :return: True while a job is running. Only one job runs per page at a time.
+        """
+        return self.job is not None
+
+    def run(self, job, on_done, status):
+        """
+        Starts the job and polls it until it is over, then calls on_done(job).
+        :param status: Shown next to the progress bar while the job runs
+        """
+        self.job = job.start()
+        self.on_done = on_done
+        self.progress_bar['value'] = 0
+        self.status_label['text'] = status
+        self.cancel_button['state'] = 'normal'
+        self.after(POLL_INTERVAL, self.poll)
+
+    def poll(self):
+        """
+        Updates the progress bar, and finishes the job once its thread is done.
+        """
+        job = self.job
+        self.progress_bar['value'] = job.progress
+        if not job.done():
+            if job.status is not None and not job.stop.is_set():
+                self.status_label['text'] = job.status
+            self.after(POLL_INTERVAL, self.poll)
+            return
+
+        self.job = None
+        self.cancel_button['state'] = 'disabled'
+        if job.cancelled:
+            self.status_label['text'] = "Cancelled"
+        elif job.error is not None:
+            self.status_label['text'] = "Failed"
+        else:
+            self.status_label['text'] = "Done"
+        self.on_done(job)
+
+    def cancel(self):
+        """
+        Method for self.cancel_button
+        The job stops at the end of its current chunk.
+        """
+        if self.job is not None:
+            self.job.cancel()
+            self.status_label['text'] = "Cancelling..."
+
+
+class PreviewPane(tk.Frame):
+    """
+    Shows a text of any length in fixed width rows, through a TextWindow.
+    Only the rows that fit on screen are ever put into the Text widget, so scrolling or jumping through a
+    huge output costs the same as through a short one. The pane keeps a reference to the text, never a copy.
+    """
+    def __init__(self, parent, text=""):
+        tk.Frame.__init__(self, parent)
+        self.window = TextWindow(text)
+        self.first = 0
+        self.visible = 1
+        self.font = tkfont.Font(family=PREVIEW_FONT[0], size=PREVIEW_FONT[1])
+
+        self.text = tk.Text(self, width=PREVIEW_WIDTH, height=1, wrap='none', font=self.font, state='disabled')
+        self.text.tag_configure('offset', background='yellow')
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.scroll)
+        offset_label = tk.Label(self, text="Offset")
+        self.offset_entry = tk.Entry(self, width=12)
+        go_button = tk.Button(self, text="Go", command=self.jump)
+
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(1, weight=1)
+        self.text.grid(row=0, column=0, columnspan=3, sticky='nsew')
+        self.scrollbar.grid(row=0, column=3, sticky='ns')
+        offset_label.grid(row=1, column=0, sticky='w')
+        self.offset_entry.grid(row=1, column=1, sticky='w')
+        go_button.grid(row=1, column=2, sticky='e')
+
+        self.text.bind('<Configure>', self.resize)
+        self.text.bind('<MouseWheel>', self.wheel)
+        self.text.bind('<Button-4>', self.wheel)
+        self.text.bind('<Button-5>', self.wheel)
+        self.offset_entry.bind('<Return>', lambda event: self.jump())
+
+    def show(self, source):
+        """
+        Shows a new text from its start.
+        :param source: A string, a bytes like object or a TextWindow (e.g. TextWindow.from_file)
+        """
+        if self.window is not source:
+            self.window.close()
+        self.window = source if isinstance(source, TextWindow) else TextWindow(source)
+        self.first = 0
+        self.render()
+
+    def render(self, highlight=None):
+        """
+        Puts the visible rows into the Text widget and moves the scrollbar to match.
+        :param highlight: Offset of a character to mark, if it is on screen
+        """
+        rows = self.window.rows(self.first, self.visible)
+        self.text['state'] = 'normal'
+        self.text.delete(1.0, tk.END)
+        self.text.insert(1.0, "\n".join(rows))
+        if highlight is not None:
+            row = highlight // self.window.width - self.first
+            column = highlight % self.window.width
+            if 0 <= row < len(rows):
+                self.text.tag_add('offset', "%d.%d" % (row + 1, column))
+        self.text['state'] = 'disabled'
+
+        total = self.window.row_count()
+        self.scrollbar.set(self.first / total, min((self.first + self.visible) / total, 1.0))
+
+    def move_to(self, first):
+        """
+        Scrolls so that row [first] is on top, keeping the last page full.
+        """
+        last = max(self.window.row_count() - self.visible, 0)
+        self.first = min(max(int(first), 0), last)
+
+    def scroll(self, action, amount, what=None):
+        """
+        Method for self.scrollbar
+        """
+        if action == 'moveto':
+            self.move_to(float(amount) * self.window.row_count())
+        else:
+            step = self.visible if what == 'pages' else 1
+            self.move_to(self.first + int(amount) * step)
+        self.render()
+
+    def wheel(self, event):
+        """
+        Scrolls by WHEEL_ROWS rows per step of the mouse wheel (event.delta on Windows and Mac, buttons 4
+        and 5 on X11).
+        """
+        up = event.num == 4 or getattr(event, 'delta', 0) > 0
+        self.move_to(self.first + (-WHEEL_ROWS if up else WHEEL_ROWS))
+        self.render()
+        return 'break'
+
+    def resize(self, event):
+        """
+        Shows as many rows as fit in the new height of the Text widget.
+        """
+        visible = max(event.height // self.font.metrics('linespace'), 1)
+        if visible != self.visible:
+            self.visible = visible
+            self.move_to(self.first)
+            self.render()
+
+    def jump(self):
+        """
+        Method for go_button
+        Scrolls to the character at the offset typed into offset_entry, and marks it.
+        """
+        try:
+            offset = min(max(int(self.offset_entry.get()), 0), max(len(self.window) - 1, 0))
+        except ValueError:
+            return
+        self.move_to(self.window.row_of(offset))
+        self.render(highlight=offset)
+
+
 class StartPage(tk.Frame):
     """
     Displays 3 buttons each leading to one of the main other pages in the app.
@@ -99,12 +309,13 @@ class EncryptPage(tk.Frame):
         """
         tk.Frame.__init__(self, parent)
 
-        self.ciphers = ('Transposition Cipher', 'Caesar Cipher', 'Viginere Cipher', 'Playfair Cipher')
+        self.ciphers = tuple(CIPHERS)
+        self.cipher_instances = {name: cipher_class() for name, cipher_class in CIPHERS.items()}
 
         self.input_mode = tk.StringVar()
         self.file_path = tk.StringVar()
         self.cipher_name = tk.StringVar()
-        self.cipher = Cipher()
+        self.cipher = None
         self.plain_text = ""
         self.cipher_text = ""
 
@@ -126,10 +337,11 @@ class EncryptPage(tk.Frame):
         encrypt_button = tk.Button(self, text="Encrypt", command=self.encrypt)
 
         preview_label = tk.Label(self, text="Preview")
-        self.preview_message = tk.Message(self, text="Provide text input or select a file to upload.")
+        self.preview = PreviewPane(self, "Provide text input or select a file to upload.")
         fat_label = tk.Label(self)
         back_button = tk.Button(self, text="Back", command=lambda: controller.show_frame(StartPage))
         save_button = tk.Button(self, text="Save", command=self.file_save)
+        self.jobs = JobPanel(self)
 
         # Place elements
         rb_text.grid(row=0, column=0, sticky='nsew')
@@ -147,10 +359,11 @@ class EncryptPage(tk.Frame):
         encrypt_button.grid(row=7, column=1, sticky='nsew')
 
         preview_label.grid(row=0, column=2, columnspan=3, sticky='ns')
-        self.preview_message.grid(row=1, column=2, rowspan=6, columnspan=3, sticky='nsew')
+        self.preview.grid(row=1, column=2, rowspan=6, columnspan=3, sticky='nsew')
         fat_label.grid(row=7, column=2)
         back_button.grid(row=7, column=3)
         save_button.grid(row=7, column=4)
+        self.jobs.grid(row=8, column=0, columnspan=5, sticky='nsew')
 
     def clear_text(self):
         """
@@ -163,22 +376,10 @@ class EncryptPage(tk.Frame):
         """
         Method for self.open_button
         Opens the file selector and returns selected file path into self.file_path_label
+        The file is only read when it is encrypted, a chunk at a time.
         """
         self.file_path = filedialog.askopenfilename(filetypes=[("Text files", "*.txt")], initialdir='~', title="Title")
         self.file_path_label["text"] = self.file_path
-        self.read_file()
-
-    def read_file(self):
-        """
-        Converts file content into a string.
-        That content is saved into self.plain_text, then stripped of all white spaces.
-        :return:
-        """
-        self.plain_text = ""
-        tfile = open(self.file_path)
-        for line in tfile:
-            self.plain_text += line
-        self.plain_text.strip()
 
     def rb_pushed(self):
         """
@@ -209,29 +410,36 @@ class EncryptPage(tk.Frame):
 
     def encrypt(self):
         """
-        Calls selected cipher's encrypt() method on the plain text,
-        encrypts it into cipher text, then displays the cipher text on preview_message.
+        Encrypts the plain text (or the selected file) with the selected cipher on a worker thread,
+        then displays the cipher text on the preview.
+        The plain text is stripped of all white spaces first.
         """
-        # 'Transposition Cipher', 'Caesar Cipher', 'RSA Cipher')
-
-        if self.cipher_name.get() == 'Transposition Cipher':
-            self.cipher = TranspositionCipher()
-        elif self.cipher_name.get() == 'Caesar Cipher':
-            self.cipher = CaesarCipher()
-        elif self.cipher_name.get() == 'Viginere Cipher':
-            self.cipher = ViginereCipher()
-        elif self.cipher_name.get() == 'Playfair Cipher':
-            self.cipher = PlayfairCipher()
+        if self.jobs.busy():
+            return
+        self.cipher = self.cipher_instances.get(self.cipher_name.get(), self.cipher)
+        if self.cipher is None:
+            self.preview.show("Choose a cipher to encrypt with first.")
+            return
+        key = self.key_entry.get()
 
         if self.input_mode.get() == "text_mode":
             self.plain_text = self.input_text.get(1.0, tk.END)
+            job = Job(cipher_job, self.cipher, key, text=self.plain_text, strip_whitespace=True, cache=RESULTS)
+        elif isinstance(self.file_path, str) and self.file_path:
+            job = Job(cipher_job, self.cipher, key, path=self.file_path, strip_whitespace=True, cache=RESULTS)
         else:
-            self.read_file()
+            return
+        self.jobs.run(job, self.encrypt_done, "Encrypting...")
 
-        self.plain_text = "".join(self.plain_text.split())
-        key = self.key_entry.get()
-        self.cipher_text = self.cipher.encrypt(self.plain_text, key)
-        self.preview_message['text'] = self.cipher_text
+    def encrypt_done(self, job):
+        """
+        Shows the cipher text of a finished encryption job, or why it failed.
+        """
+        if job.error is not None:
+            self.preview.show(str(job.error))
+        elif not job.cancelled:
+            self.cipher_text = job.result
+            self.preview.show(self.cipher_text)
 
 
 class DecryptPage(tk.Frame):
@@ -252,12 +460,13 @@ class DecryptPage(tk.Frame):
         tk.Frame.__init__(self, parent)
 
         self.file_path = tk.StringVar()
-        self.cipher = Cipher()
+        self.cipher = None
         self.cipher_text = ""
         self.plain_text = ""
         self.key_entry = ""
 
-        self.ciphers = ('Transposition Cipher', 'Caesar Cipher', 'Viginere Cipher', 'Playfair Cipher')
+        self.ciphers = tuple(CIPHERS)
+        self.cipher_instances = {name: cipher_class() for name, cipher_class in CIPHERS.items()}
         self.cipher_name = tk.StringVar()
 
         self.grid_columnconfigure(0, minsize=400)
@@ -272,6 +481,14 @@ class DecryptPage(tk.Frame):
         analyze_button = tk.Button(self, text="Analyze", command=self.analyze)
 
         analysis_notebook = ttk.Notebook(self)
+        self.identify_label = tk.Label(analysis_notebook, justify='left', anchor='nw', font=("Courier", 11))
+        analysis_notebook.add(self.identify_label, text="Cipher")
+        self.stats_label = tk.Label(analysis_notebook, justify='left', anchor='nw', font=("Courier", 11))
+        self.caesar_label = tk.Label(analysis_notebook, justify='left', anchor='nw', font=("Courier", 11))
+        analysis_notebook.add(self.stats_label, text="Statistics")
+        self.vigenere_label = tk.Label(analysis_notebook, justify='left', anchor='nw', font=("Courier", 11))
+        analysis_notebook.add(self.caesar_label, text="Caesar")
+        analysis_notebook.add(self.vigenere_label, text="Viginere")
 
         cipher_label = tk.Label(self, text="Cipher")
         cipher_cbbox = ttk.Combobox(self, textvariable=self.cipher_name)
@@ -282,9 +499,10 @@ class DecryptPage(tk.Frame):
         decrypt_button = tk.Button(self, text="Decrypt", command=self.decrypt)
 
         preview_label = tk.Label(self, text="Preview")
-        self.preview_message = tk.Message(self, text="Provide text input or select a file to upload.")
+        self.preview = PreviewPane(self, "Provide text input or select a file to upload.")
         back_button = tk.Button(self, text="Back", command=lambda: controller.show_frame(StartPage))
         save_button = tk.Button(self, text="Save", command=self.file_save)
+        self.jobs = JobPanel(self)
 
         # Place widgets
         self.file_path_label.grid(row=0, column=0, sticky='nsw')
@@ -301,9 +519,10 @@ class DecryptPage(tk.Frame):
         decrypt_button.grid(row=7, column=1, sticky='nsew')
 
         preview_label.grid(row=0, column=2, sticky='ns')
-        self.preview_message.grid(row=1, column=2, rowspan=6, columnspan=3, sticky='nsew')
+        self.preview.grid(row=1, column=2, rowspan=6, columnspan=3, sticky='nsew')
         back_button.grid(row=7, column=3, sticky='nsew')
         save_button.grid(row=7, column=4, sticky='nsew')
+        self.jobs.grid(row=8, column=0, columnspan=5, sticky='nsew')
 
     def open_file(self):
         """
@@ -315,34 +534,93 @@ class DecryptPage(tk.Frame):
         self.read_file()
 
     def analyze(self):
-        pass
+        """
+        Method for analyze_button
+        Analyzes the cipher text on a worker thread.
+        """
+        if self.jobs.busy():
+            return
+        self.jobs.run(Job(analyze_job, self.cipher_text), self.analyze_done, "Analyzing...")
+
+    def analyze_done(self, job):
+        """
+        Shows the most likely ciphers, the letter statistics of the cipher text, and the most likely caesar
+        and Viginere keys. The most likely cipher is selected if the classifier is sure enough, and if the
+        selected cipher is caesar or Viginere, its best key is put into the key entry.
+        """
+        if job.error is not None or job.cancelled:
+            return
+        stats, ranks, vigenere_ranks, cipher_ranks = job.result
+        names = {cipher: name for name, cipher in CIPHERS.items()}
+        self.identify_label['text'] = "Cipher                          Confidence\n" + "\n".join(
+            "%-30s   %9.0f%%" % (names[cipher], 100 * confidence) for cipher, confidence in cipher_ranks)
+        best, confidence = cipher_ranks[0]
+        if confidence >= IDENTIFY_CONFIDENCE:
+            self.cipher_name.set(names[best])
+
+        top_letters = sorted(range(26), key=lambda i: -stats.unigrams[i])[:6]
+        self.stats_label['text'] = "\n".join([
+            "Letters:               %d" % stats.letters,
+            "Other characters:      %d" % stats.non_letters,
+            "Letter ratio:          %.3f" % stats.letter_ratio(),
+            "Index of coincidence:  %.4f" % stats.index_of_coincidence(),
+            "  (English ~0.066, random ~0.038)",
+            "Most common letters:   " + " ".join(chr(97 + i) for i in top_letters),
+        ])
+
+        self.caesar_label['text'] = "Caesar key   chi-squared\n" + "\n".join(
+            "%10d   %11.1f" % (key, score) for key, score in ranks[:5])
+        if self.cipher_name.get() == 'Caesar Cipher':
+            self.key_entry.delete(0, tk.END)
+            self.key_entry.insert(0, str(ranks[0][0]))
+
+        self.vigenere_label['text'] = "Length   IoC      Key\n" + "\n".join(
+            "%6d   %.4f   %s" % (length, ioc, key) for key, length, ioc in vigenere_ranks)
+        if self.cipher_name.get() == 'Viginere Cipher' and vigenere_ranks:
+            self.key_entry.delete(0, tk.END)
+            self.key_entry.insert(0, vigenere_ranks[0][0])
 
     def read_file(self):
         """
-        Converts file content into a string.
-        That content is saved into self.plain_text, then stripped of all white spaces.
-        :return:
+        Converts file content into a string on a worker thread.
+        That content is saved into self.cipher_text.
         """
-        self.cipher_text = ""
-        tfile = open(self.file_path)
-        for line in tfile:
-            self.cipher_text += line
-        self.cipher_text.strip()
+        if self.jobs.busy() or not self.file_path:
+            return
+        self.jobs.run(Job(read_job, self.file_path), self.read_done, "Reading...")
 
-    def decrypt(self):
-        if self.cipher_name.get() == 'Transposition Cipher':
-            self.cipher = TranspositionCipher()
-        elif self.cipher_name.get() == 'Caesar Cipher':
-            self.cipher = CaesarCipher()
-        elif self.cipher_name.get() == 'Viginere Cipher':
-            self.cipher = ViginereCipher()
-        elif self.cipher_name.get() == 'Playfair Cipher':
-            self.cipher = PlayfairCipher()
+    def read_done(self, job):
+        """
+        Keeps the contents of a file that finished reading.
+        """
+        if job.error is not None:
+            self.file_path_label["text"] = str(job.error)
+        elif not job.cancelled:
+            self.cipher_text = job.result
 
+    def decrypt(self):
+        """
+        Decrypts the cipher text with the selected cipher on a worker thread.
+        """
+        if self.jobs.busy():
+            return
+        self.cipher = self.cipher_instances.get(self.cipher_name.get(), self.cipher)
+        if self.cipher is None:
+            self.preview.show("Choose a cipher to decrypt with first.")
+            return
         key = self.key_entry.get()
-        self.plain_text = self.cipher.decrypt(self.cipher_text, key)
+        self.jobs.run(Job(cipher_job, self.cipher, key, decrypt=True, text=self.cipher_text, cache=RESULTS),
+                      self.decrypt_done, "Decrypting...")
 
-        self.preview_message['text'] = self.plain_text
+    def decrypt_done(self, job):
+        """
+        Shows the plain text of a finished decryption job, or why it failed.
+        """
+        if job.error is not None:
+            self.preview.show(str(job.error))
+        elif not job.cancelled:
+            self.plain_text = job.result
+            self.preview.show(self.plain_text)
 
     def file_save(self):
         """
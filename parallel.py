@@ -0,0 +1,171 @@
+#
+# CS106 Final Project
+# CryptWing
+#
+# parallel mode
+#
+# Shion Fukuzawa (sf27)
+# December 15, 2016
+#
+# This file splits one large text into chunks and runs a cipher on every chunk in its own process.
+# The text and the result live in shared memory, so the workers only receive the chunk boundaries.
+#
+# Where a text can be split:
+#   Caesar:   anywhere, every character is shifted the same way
+#   Viginere: anywhere, as long as each chunk starts at key position start % len(key)
+#   Playfair: between digraphs, once the text has been prepared
+#
+
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from classical_ciphers import CaesarCipher, ViginereCipher, PlayfairCipher, PlayfairNormalizer, render_digraphs, \
+    PLAYFAIR_PAIR_TABLE
+
+# Chunks smaller than this are not worth sending to another process
+PARALLEL_MIN_CHUNK = 1 << 18
+
+# Each worker gets about this many chunks, so a slow worker does not hold up the rest
+CHUNKS_PER_WORKER = 4
+
+
+def attach_shared_memory(name):
+    """
+    Attaches to a shared memory block created by the parent process. The parent owns the block and
+    unlinks it, so the worker asks not to be tracked where Python supports that. (Older versions
+    register it with the resource tracker the workers share with the parent, which is harmless.)
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def process_range(cipher_class, key, decrypt, in_name, out_name, start, end):
+    """
+    Runs in a worker process. Processes the bytes [start, end) of the input block into the same range
+    of the output block.
+    """
+    source = attach_shared_memory(in_name)
+    target = attach_shared_memory(out_name)
+    try:
+        cipher = cipher_class()
+        if issubclass(cipher_class, PlayfairCipher):
+            square = cipher.key_schedule(key)
+            # The text is already prepared, so its digraphs are only read off
+            digraphs = PlayfairNormalizer(encrypting=False).update(source.buf[start:end])
+            target.buf[start:end] = square.convert(digraphs, encrypting=not decrypt, as_bytes=True)
+        else:
+            if decrypt:
+                stream = cipher.stream_decryptor(key)
+            else:
+                stream = cipher.stream_encryptor(key)
+            stream.seek(start)
+            target.buf[start:end] = stream.update(bytes(source.buf[start:end]))
+    finally:
+        source.close()
+        target.close()
+
+
+def prepare_data(cipher, text, key, decrypt):
+    """
+    Turns the text into the ASCII bytes that will be split between the workers.
+    :return: The bytes, or None if this text has to be processed serially
+    """
+    if isinstance(cipher, (CaesarCipher, ViginereCipher)):
+        try:
+            if decrypt:
+                cipher.stream_decryptor(key)
+            else:
+                cipher.stream_encryptor(key)
+        except ValueError:  # Let the serial path produce its error message
+            return None
+        if isinstance(text, str):
+            if not text.isascii():
+                return None
+            return text.encode('ascii')
+        return bytes(text)
+
+    if isinstance(cipher, PlayfairCipher) and isinstance(text, str):
+        if not decrypt and len(key) > 25:
+            return None
+        try:
+            digraphs = PlayfairNormalizer(encrypting=not decrypt).normalize(text)
+        except ValueError:  # Let the serial path produce its error message
+            return None
+        return render_digraphs(digraphs, PLAYFAIR_PAIR_TABLE, as_bytes=True)
+
+    return None
+
+
+def chunk_bounds(size, workers, min_chunk=PARALLEL_MIN_CHUNK):
+    """
+    Splits [0, size) into ranges for the workers. Every range starts at an even offset, so a prepared
+    Playfair text is only ever cut between digraphs.
+    :return: List of (start, end)
+    """
+    count = max(1, min(workers * CHUNKS_PER_WORKER, size // max(min_chunk, 1)))
+    chunk = math.ceil(size / count)
+    chunk += chunk % 2
+    return [(start, min(start + chunk, size)) for start in range(0, size, chunk)]
+
+
+def parallel_process(cipher, text, key=None, decrypt=False, workers=None, executor=None,
+                     min_chunk=PARALLEL_MIN_CHUNK):
+    """
+    Encrypts or decrypts one large text using several processes. The result is identical to the
+    serial encrypt()/decrypt() methods; ciphers or texts that cannot be split (the transposition cipher,
+    non-ASCII text, invalid keys) are simply processed serially.
+    :param text: A string, or ASCII bytes for the caesar and Viginere ciphers
+    :param workers: Number of worker processes, defaults to the number of CPUs
+    :param executor: An existing ProcessPoolExecutor to reuse. One is created for this call otherwise.
+    :return: The result, of the same type as the text
+    """
+    data = prepare_data(cipher, text, key, decrypt)
+    if not data:
+        if decrypt:
+            return cipher.decrypt(text, key)
+        return cipher.encrypt(text, key)
+
+    size = len(data)
+    source = shared_memory.SharedMemory(create=True, size=size)
+    target = shared_memory.SharedMemory(create=True, size=size)
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        source.buf[:size] = data
+        del data
+        bounds = chunk_bounds(size, workers or os.cpu_count(), min_chunk)
+        futures = [executor.submit(process_range, type(cipher), key, decrypt, source.name, target.name, start, end)
+                   for start, end in bounds]
+        for future in futures:
+            future.result()
+        result = bytes(target.buf[:size])
+    finally:
+        if own_executor:
+            executor.shutdown()
+        source.close()
+        source.unlink()
+        target.close()
+        target.unlink()
+
+    if isinstance(text, str):
+        return result.decode('ascii')
+    return result
+
+
+def parallel_encrypt(cipher, text, key=None, workers=None, executor=None):
+    """
+    Encrypts the text with parallel_process.
+    """
+    return parallel_process(cipher, text, key, decrypt=False, workers=workers, executor=executor)
+
+
+def parallel_decrypt(cipher, text, key=None, workers=None, executor=None):
+    """
+    Decrypts the text with parallel_process.
+    """
+    return parallel_process(cipher, text, key, decrypt=True, workers=workers, executor=executor)
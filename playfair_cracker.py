@@ -0,0 +1,358 @@
+#
+# CS106 Final Project
+# CryptWing
+#
+# playfair cracker
+#
+# Shion Fukuzawa (sf27)
+# December 15, 2016
+#
+# This file recovers the key square of the playfair cipher by simulated annealing: a square is changed a
+# little at a time, and the change is kept whenever the decryption looks more like English, or sometimes
+# even when it does not, so the search can climb out of dead ends. Independent restarts run in parallel.
+#
+# Algorithms referenced from
+#    http://practicalcryptography.com/cryptanalysis/stochastic-searching/cryptanalysis-playfair/
+#
+
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from classical_ciphers import PLAYFAIR_ALPHABET, PLAYFAIR_INDEX, PlayfairCipher, playfair_letters
+from fitness import english_scorer
+
+
+def build_position_map(step):
+    """
+    The playfair rules only depend on where the two letters sit in the square, not on which letters they are.
+    This applies them once to every pair of positions, so that any square can decrypt a digraph with two
+    lookups, without building its own digraph map.
+    :param step: 1 for encrypting, -1 for decrypting, as in PlayfairKeySquare.build_map
+    :return: (first, second) lists of 625 positions, where the pair of positions (p1, p2) at p1 * 25 + p2
+             turns into (first[p1 * 25 + p2], second[p1 * 25 + p2])
+    """
+    first = []
+    second = []
+    for position1 in range(25):
+        row1, column1 = divmod(position1, 5)
+        for position2 in range(25):
+            row2, column2 = divmod(position2, 5)
+            if row1 == row2:  # If on the same row
+                pair = (row1 * 5 + (column1 + step) % 5, row2 * 5 + (column2 + step) % 5)
+            elif column1 == column2:  # If on the same column
+                pair = ((row1 + step) % 5 * 5 + column1, (row2 + step) % 5 * 5 + column2)
+            else:
+                pair = (row1 * 5 + column2, row2 * 5 + column1)
+            first.append(pair[0])
+            second.append(pair[1])
+    return first, second
+
+
+DECRYPT_POSITIONS = build_position_map(-1)
+
+# Playfair letter (0 ~ 24) -> letter of the full alphabet (0 ~ 25), which the quadgram scorer counts in
+FULL_ALPHABET_INDEX = [ord(c) - 97 for c in PLAYFAIR_ALPHABET]
+
+
+def random_square(rng):
+    """
+    :return: A random key square, as a list of the 25 playfair letters (0 ~ 24) in reading order
+    """
+    square = list(range(25))
+    rng.shuffle(square)
+    return square
+
+
+def mutate(square, rng):
+    """
+    Makes a small random change to a copy of the square. Most of the time two letters are swapped; now and
+    then two rows or two columns are swapped, or the square is flipped, which keeps the letters that are
+    already in the right rows and columns together.
+    :return: The changed copy
+    """
+    square = square[:]
+    choice = rng.random()
+    if choice < 0.9:
+        i, j = rng.randrange(25), rng.randrange(25)
+        square[i], square[j] = square[j], square[i]
+    elif choice < 0.92:
+        i, j = rng.sample(range(5), 2)
+        square[i * 5:i * 5 + 5], square[j * 5:j * 5 + 5] = square[j * 5:j * 5 + 5], square[i * 5:i * 5 + 5]
+    elif choice < 0.94:
+        i, j = rng.sample(range(5), 2)
+        square[i::5], square[j::5] = square[j::5], square[i::5]
+    elif choice < 0.96:  # Flip top to bottom
+        square = [c for row in range(20, -1, -5) for c in square[row:row + 5]]
+    elif choice < 0.98:  # Flip left to right
+        square = [c for row in range(0, 25, 5) for c in reversed(square[row:row + 5])]
+    else:  # Turn the square around
+        square.reverse()
+    return square
+
+
+class SquareScorer:
+    """
+    Decrypts one cipher text under any number of candidate squares and scores the results.
+    The cipher text is converted to playfair letters once; each candidate then only needs the position of
+    every letter in its square, because the rules themselves were applied in advance by build_position_map.
+    """
+
+    def __init__(self, letters, scorer=None):
+        """
+        :param letters: Cipher text, as an even number of playfair letters (see playfair_letters)
+        :param scorer: QuadgramScorer to use, the English sample by default
+        """
+        self.scorer = scorer or english_scorer()
+        self.quadgrams = max(len(letters) - 3, 1)
+        indices = [PLAYFAIR_INDEX[c] for c in letters]
+        if np is not None:
+            self.first = np.asarray(indices[0::2], dtype=np.int64)
+            self.second = np.asarray(indices[1::2], dtype=np.int64)
+            # Row p1 * 25 + p2 holds the pair of positions (p1, p2) decrypts to
+            self.decrypt_positions = np.asarray(DECRYPT_POSITIONS, dtype=np.int64).T.copy()
+            self.full_index = np.asarray(FULL_ALPHABET_INDEX, dtype=np.int64)
+            self.positions = np.arange(25)
+        else:
+            self.first = indices[0::2]
+            self.second = indices[1::2]
+
+    def decrypt(self, square):
+        """
+        :param square: Key square as a list of 25 playfair letters (0 ~ 24)
+        :return: The decrypted letters (0 ~ 25, full alphabet), as an array (list without NumPy)
+        """
+        if np is not None:
+            square = np.asarray(square)
+            where = np.empty(25, dtype=np.int64)
+            where[square] = self.positions
+            pairs = where[self.first] * 25 + where[self.second]
+            # Each digraph becomes a row of two positions, which the square turns back into letters
+            return self.full_index[square][self.decrypt_positions[pairs]].ravel()
+
+        where = [0] * 25
+        for position, letter in enumerate(square):
+            where[letter] = position
+        decrypt_first, decrypt_second = DECRYPT_POSITIONS
+        letters = [FULL_ALPHABET_INDEX[letter] for letter in square]
+        plain = []
+        for a, b in zip(self.first, self.second):
+            pair = where[a] * 25 + where[b]
+            plain.append(letters[decrypt_first[pair]])
+            plain.append(letters[decrypt_second[pair]])
+        return plain
+
+    def score(self, square):
+        """
+        :return: Quadgram score of the text decrypted with the square
+        """
+        return self.scorer.score_indices(self.decrypt(square))
+
+
+class AnnealResult:
+    """
+    The outcome of one restart of the search.
+        key: The best square found, as a 25 letter key PlayfairCipher accepts
+        fitness: Its score per quadgram (see QuadgramScorer.fitness)
+        iterations: How many squares were tried
+        seconds: How long the restart ran for, on one core
+    """
+
+    def __init__(self, key, fitness, iterations, seconds):
+        self.key = key
+        self.fitness = fitness
+        self.iterations = iterations
+        self.seconds = seconds
+
+    def rate(self):
+        """
+        :return: Squares tried per second
+        """
+        return self.iterations / max(self.seconds, 1e-9)
+
+    def __repr__(self):
+        return "AnnealResult(%r, %.3f, %d iterations, %.0f/s)" % (self.key, self.fitness, self.iterations,
+                                                                   self.rate())
+
+
+# Set by whichever worker reaches the fitness threshold first, so the others stop too
+_STOP = None
+
+# How many iterations pass between checks of the stop flag
+CHECK_INTERVAL = 1000
+
+# How many changes in a row may fail to improve the square before the final polish gives up
+POLISH_PATIENCE = 5000
+
+
+def install_stop_event(event):
+    """
+    Worker process initializer: shares the stop flag of the search with this process.
+    """
+    global _STOP
+    _STOP = event
+
+
+def anneal(letters, seed, iterations, temperature, threshold=None):
+    """
+    Runs one restart of simulated annealing from a random square. The temperature falls linearly to 0 over
+    the iterations; a worse square is accepted with probability exp(change / temperature).
+    Once the fitness reaches the threshold, the other workers are told to stop, and this one only keeps the
+    changes that improve the best square, to fix the last few letters, until it stops improving.
+    :param letters: Cipher text, as an even number of playfair letters
+    :param temperature: Starting temperature per 100 quadgrams of text
+    :param threshold: Fitness at which the search is taken to have succeeded
+    :return: AnnealResult
+    """
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    scorer = SquareScorer(letters)
+    temperature *= scorer.quadgrams / 100
+
+    parent = random_square(rng)
+    parent_score = scorer.score(parent)
+    best, best_score = parent, parent_score
+
+    polishing = False
+    unchanged = 0
+    iteration = 0
+    while iteration < iterations:
+        if polishing:
+            if unchanged >= POLISH_PATIENCE:
+                break
+        elif iteration % CHECK_INTERVAL == 0:
+            if threshold is not None and best_score / scorer.quadgrams >= threshold:
+                if _STOP is not None:
+                    _STOP.set()
+                polishing = True
+                parent, parent_score = best, best_score
+            elif _STOP is not None and _STOP.is_set():
+                break
+
+        cooling = 0 if polishing else temperature * (1 - iteration / iterations)
+        child = mutate(parent, rng)
+        child_score = scorer.score(child)
+        change = child_score - parent_score
+        unchanged += 1
+        if change >= 0 or (cooling > 0 and rng.random() < math.exp(change / cooling)):
+            parent, parent_score = child, child_score
+            if parent_score > best_score:
+                best, best_score = parent, parent_score
+                unchanged = 0
+        iteration += 1
+
+    key = "".join(PLAYFAIR_ALPHABET[letter] for letter in best)
+    return AnnealResult(key, best_score / scorer.quadgrams, iteration, time.perf_counter() - start)
+
+
+class PlayfairSolver:
+    """
+    Breaks the playfair cipher without knowing the key.
+    Runs [restarts] independent simulated annealing searches over a pool of worker processes and keeps the
+    square whose decryption scores best against English quadgrams. As soon as one search reaches the
+    fitness threshold, the rest are stopped.
+    """
+
+    def __init__(self, restarts=8, iterations=300000, temperature=2.0, threshold=-4.8, workers=None, seed=None):
+        """
+        :param restarts: Number of independent searches
+        :param iterations: Squares each search tries
+        :param temperature: Starting temperature per 100 quadgrams of cipher text
+        :param threshold: Fitness at which a decryption is taken to be English. None always runs every search.
+        :param workers: Number of worker processes, defaults to the number of CPUs. 1 runs in this process.
+        :param seed: Seed for reproducible searches
+        """
+        self.restarts = restarts
+        self.iterations = iterations
+        self.temperature = temperature
+        self.threshold = threshold
+        self.workers = workers or os.cpu_count()
+        self.seed = seed
+        self.elapsed = 0.0
+
+    def crack(self, text):
+        """
+        :param text: Playfair cipher text
+        :return: List of AnnealResult for the restarts that ran, best first. How long the whole search took
+                 is left in self.elapsed.
+        """
+        letters = playfair_letters(text)
+        letters = letters[:len(letters) - len(letters) % 2]
+        seeds = random.Random(self.seed).sample(range(1 << 30), self.restarts)
+        args = (self.iterations, self.temperature, self.threshold)
+
+        start = time.perf_counter()
+        english_scorer()  # Builds the quadgram table file once, before the workers map it
+        results = []
+        if self.workers == 1:
+            for seed in seeds:
+                results.append(anneal(letters, seed, *args))
+                if self.threshold is not None and results[-1].fitness >= self.threshold:
+                    break
+        else:
+            stop = multiprocessing.Event()
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=install_stop_event,
+                                     initargs=(stop,)) as pool:
+                pending = {pool.submit(anneal, letters, seed, *args) for seed in seeds}
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    results.extend(future.result() for future in done)
+                    if stop.is_set():
+                        for future in pending:
+                            future.cancel()
+                        results.extend(future.result() for future in pending if not future.cancelled())
+                        break
+            # Restarts that were already queued when the search stopped did not get to run
+            results = [result for result in results if result.iterations]
+        self.elapsed = time.perf_counter() - start
+
+        return sorted(results, key=lambda result: -result.fitness)
+
+    def report(self, results):
+        """
+        :return: A summary of the search: the best result, and the speed per core and overall
+        """
+        iterations = sum(result.iterations for result in results)
+        busy = sum(result.seconds for result in results)
+        lines = ["%d restarts, %d iterations in %.2f s" % (len(results), iterations, self.elapsed),
+                 "%.0f iterations/s per core, %.0f iterations/s overall" % (iterations / max(busy, 1e-9),
+                                                                            iterations / max(self.elapsed, 1e-9))]
+        if results:
+            lines.append("best key %s, fitness %.3f" % (results[0].key, results[0].fitness))
+        return "\n".join(lines)
+
+    def solve(self, text):
+        """
+        Recovers the most likely key square and decrypts the text with it.
+        :return: (key, decrypted text)
+        """
+        results = self.crack(text)
+        if not results:
+            return "", text
+        key = results[0].key
+        letters = playfair_letters(text)
+        return key, PlayfairCipher().decrypt(letters[:len(letters) - len(letters) % 2], key)
+
+
+if __name__ == "__main__":
+    plain = "The Playfair cipher was the first practical digraph substitution cipher. It was invented by " \
+            "Charles Wheatstone, but it bears the name of Lord Playfair, who promoted its use. The technique " \
+            "encrypts pairs of letters instead of single letters as in the simple substitution cipher, " \
+            "which makes it much harder to break, since the frequency analysis used for simple " \
+            "substitution ciphers does not work with it. As a student interested in security and " \
+            "cryptographic algorithms, studying and implementing various algorithms proved to be a " \
+            "challenge and great learning experience. Reading about the different weaknesses each have on " \
+            "how to decrypt them was especially fascinating."
+    secret = PlayfairCipher().encrypt(plain, "monarchy")
+    solver = PlayfairSolver(restarts=4)
+    results = solver.crack(secret)
+    print(solver.report(results))
+    print(PlayfairCipher().decrypt(secret, results[0].key))
@@ -0,0 +1,90 @@
+#
+# CS106 Final Project
+# CryptWing
+#
+# preview
+#
+# Shion Fukuzawa (sf27)
+# December 15, 2016
+#
+# This file cuts a text into rows of a fixed width, so the GUI can show any part of a huge output by
+# slicing out only the rows on screen. Nothing is copied or laid out ahead of time, so the cost of a
+# preview does not depend on the length of the text.
+#
+
+import mmap
+
+# Characters per row of the preview
+PREVIEW_WIDTH = 80
+
+
+class TextWindow:
+    """
+    Fixed width rows over a text, without copying it.
+        source: A string, or a bytes like object (bytes, bytearray, mmap) of single byte characters
+        width: Characters per row. Row i is source[i * width:(i + 1) * width].
+        mapping: The memory map behind the source, if it came from a file
+    Line breaks and tabs are shown as spaces, so every row but the last has exactly [width] characters and
+    the row of any offset is offset // width.
+    """
+
+    def __init__(self, source="", width=PREVIEW_WIDTH, mapping=None):
+        self.source = source
+        self.width = max(int(width), 1)
+        self.mapping = mapping
+
+    @classmethod
+    def from_file(cls, path, width=PREVIEW_WIDTH):
+        """
+        Memory maps a file, so only the rows that are shown are ever read from disk.
+        """
+        with open(path, "rb") as file:
+            try:
+                mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # An empty file cannot be mapped
+                return cls("", width)
+        return cls(mapping, width, mapping)
+
+    def __len__(self):
+        return len(self.source)
+
+    def row_count(self):
+        """
+        :return: Number of rows, at least 1 so an empty text still has a (blank) row
+        """
+        return max((len(self.source) + self.width - 1) // self.width, 1)
+
+    def row_of(self, offset):
+        """
+        :return: The row holding the character at offset, clamped into the text
+        """
+        return min(max(int(offset), 0) // self.width, self.row_count() - 1)
+
+    def rows(self, first, count):
+        """
+        :param first: Index of the first row
+        :param count: How many rows to return, fewer if the text ends first
+        :return: List of the rows as strings
+        """
+        first = min(max(int(first), 0), self.row_count() - 1)
+        start = first * self.width
+        piece = self.source[start:start + max(int(count), 0) * self.width]
+        if not isinstance(piece, str):
+            piece = bytes(piece).decode("latin-1")
+        piece = piece.replace("\r", " ").replace("\n", " ").replace("\t", " ")
+        return [piece[i:i + self.width] for i in range(0, len(piece), self.width)]
+
+    def close(self):
+        """
+        Releases the memory map, if there is one.
+        """
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+            self.source = ""
+
+
+if __name__ == "__main__":
+    window = TextWindow("ATTACKATDAWN" * 1000000, width=64)
+    print(window.row_count(), window.row_of(5000000))
+    print("\n".join(window.rows(window.row_of(5000000), 3)))
@@ -0,0 +1,304 @@
+#
+# CS106 Final Project
+# CryptWing
+#
+# result cache
+#
+# Shion Fukuzawa (sf27)
+# December 15, 2016
+#
+# This file implements the cache that lets the same encryption or decryption, of the same text with the
+# same key, be answered without running the cipher again. Results are found by a sha256 digest of what went
+# into them, so a text read again from a reopened file still hits. Results are kept in memory only, unless
+# a disk tier is asked for; its files are private to the user, since they hold decrypted text.
+#
+
+import hashlib
+import os
+import stat
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Characters hashed at a time, so a huge text is never encoded all at once
+HASH_CHUNK_SIZE = 1 << 20
+
+# Part of every digest. Raise it whenever a cipher changes what it outputs, so results cached by an older
+# version (on disk, from an earlier run) are never served again.
+CACHE_FORMAT = 2
+
+
+def cache_directory():
+    """
+    :return: The per user directory of the disk tier: $XDG_CACHE_HOME/cryptwing/results, or
+             ~/.cache/cryptwing/results
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "cryptwing", "results")
+
+
+def result_digest(cipher_name, operation, key, chunks):
+    """
+    :param cipher_name: Name of the cipher class
+    :param operation: What was done to the text, eg. 'encrypt'
+    :param key: The key as given to the cipher
+    :param chunks: The input text, as an iterable of strings
+    :return: The sha256 hex digest that identifies the result
+    """
+    digest = hashlib.sha256()
+    header = "cryptwing-%d\0%s\0%s\0%s:%r\0" % (CACHE_FORMAT, cipher_name, operation, type(key).__name__, key)
+    digest.update(header.encode('utf-8', 'surrogatepass'))
+    for chunk in chunks:
+        for start in range(0, len(chunk), HASH_CHUNK_SIZE):
+            digest.update(chunk[start:start + HASH_CHUNK_SIZE].encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    A two tier, least recently used cache of cipher results, keyed by result_digest.
+        Memory tier: results up to spill_size characters, at most memory_size characters in total
+        Disk tier: off unless disk_size is set. Larger results, and those pushed out of memory, as files
+                   in directory, at most disk_size bytes in total. The directory is created with mode 0700
+                   and is only used if it belongs to the user and nobody else can get into it; each file
+                   is written with mode 0600.
+    Both tiers drop their least recently used entries first. Counts the hits of each tier, the misses and
+    the characters that did not have to be computed again, so the sizes can be tuned.
+    """
+
+    def __init__(self, memory_size=1 << 26, disk_size=0, spill_size=1 << 20, directory=None):
+        """
+        :param memory_size: Most characters kept in memory. 0 keeps nothing in memory.
+        :param disk_size: Most bytes kept on disk. 0 (the default) keeps nothing on disk.
+        :param spill_size: Results longer than this (in characters) go straight to disk, or are not cached
+                           at all without a disk tier
+        :param directory: Where the disk tier keeps its files, cache_directory() by default. Created when
+                          first needed.
+        """
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.spill_size = spill_size
+        self.directory = directory or cache_directory()
+        self.memory = OrderedDict()
+        self.memory_used = 0
+        self.disk = None
+        self.disk_used = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.chars_saved = 0
+        self.lock = threading.Lock()
+
+    def load_disk(self):
+        """
+        Indexes the files left in the directory by earlier runs, least recently used (oldest) first.
+        """
+        if self.disk is not None:
+            return
+        self.disk = OrderedDict()
+        self.disk_used = 0
+        if self.disk_size <= 0 or not self.private_directory(create=False):
+            return
+        try:
+            entries = []
+            for name in os.listdir(self.directory):
+                if len(name) == 64 and not name.endswith(".tmp"):
+                    info = os.stat(os.path.join(self.directory, name))
+                    entries.append((info.st_mtime, name, info.st_size))
+        except OSError:
+            return
+        for _, name, size in sorted(entries):
+            self.disk[name] = size
+            self.disk_used += size
+        self.evict_disk()
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest)
+
+    def private_directory(self, create=True):
+        """
+        Makes sure the directory can hold the disk tier: a real directory (not a link) that belongs to the
+        user, which nobody else can read or write. One that only has too open permissions is tightened.
+        :param create: Create the directory (mode 0700) if it does not exist yet
+        :return: Whether the disk tier may use the directory
+        """
+        try:
+            if create:
+                os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            info = os.lstat(self.directory)
+            if not stat.S_ISDIR(info.st_mode):
+                return False
+            if hasattr(os, "getuid") and info.st_uid != os.getuid():
+                return False
+            if info.st_mode & 0o077:
+                os.chmod(self.directory, 0o700)
+        except OSError:
+            return False
+        return True
+
+    def get(self, digest):
+        """
+        :return: The cached result, or None if it is not cached
+        """
+        with self.lock:
+            if digest in self.memory:
+                self.memory.move_to_end(digest)
+                self.memory_hits += 1
+                result = self.memory[digest]
+                self.chars_saved += len(result)
+                return result
+            self.load_disk()
+            if digest not in self.disk:
+                self.misses += 1
+                return None
+
+        try:
+            with open(self.path(digest), 'rb') as file:
+                result = file.read().decode('utf-8', 'surrogatepass')
+            os.utime(self.path(digest))  # Keeps the order of use for the next run
+        except OSError:  # Removed behind our back
+            with self.lock:
+                self.disk_used -= self.disk.pop(digest, 0)
+                self.misses += 1
+            return None
+
+        with self.lock:
+            if digest in self.disk:
+                self.disk.move_to_end(digest)
+            self.disk_hits += 1
+            self.chars_saved += len(result)
+        return result
+
+    def put(self, digest, result):
+        """
+        Caches a result. Short results are kept in memory, long ones are written to disk.
+        """
+        if len(result) <= self.spill_size and len(result) <= self.memory_size:
+            with self.lock:
+                if digest in self.memory:
+                    self.memory_used -= len(self.memory[digest])
+                self.memory[digest] = result
+                self.memory_used += len(result)
+                spilled = self.evict_memory()
+            for old_digest, old_result in spilled:
+                self.write_disk(old_digest, old_result)
+        elif self.disk_size > 0:
+            self.write_disk(digest, result)
+
+    def evict_memory(self):
+        """
+        Drops the least recently used results until memory fits in memory_size. Call with the lock held.
+        :return: List of (digest, result) that were dropped, to be moved to disk
+        """
+        spilled = []
+        while self.memory_used > max(self.memory_size, 0):
+            digest, result = self.memory.popitem(last=False)
+            self.memory_used -= len(result)
+            spilled.append((digest, result))
+        return spilled
+
+    def write_disk(self, digest, result):
+        """
+        Writes a result to the disk tier. The file is written under a temporary name first, so a reader
+        never sees half of it. A disk that cannot be written to just means the result is not cached.
+        """
+        if self.disk_size <= 0:  # No disk tier
+            return
+        data = result.encode('utf-8', 'surrogatepass')
+        if len(data) > self.disk_size:
+            return
+        with self.lock:
+            self.load_disk()
+            if digest in self.disk:
+                self.disk.move_to_end(digest)
+                return
+
+        temporary = "%s.%d.%d.tmp" % (self.path(digest), os.getpid(), threading.get_ident())
+        if not self.private_directory():
+            return
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_NOFOLLOW", 0) | getattr(os, "O_BINARY", 0)
+        try:
+            with os.fdopen(os.open(temporary, flags, 0o600), 'wb') as file:
+                file.write(data)
+            os.replace(temporary, self.path(digest))
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            return
+
+        with self.lock:
+            self.disk_used += len(data) - self.disk.pop(digest, 0)
+            self.disk[digest] = len(data)
+            self.evict_disk()
+
+    def evict_disk(self):
+        """
+        Deletes the least recently used files until the disk tier fits in disk_size. Call with the lock held.
+        """
+        while self.disk_used > max(self.disk_size, 0) and self.disk:
+            digest, size = self.disk.popitem(last=False)
+            self.disk_used -= size
+            try:
+                os.remove(self.path(digest))
+            except OSError:
+                pass
+
+    def run(self, cipher, operation, text, key=None):
+        """
+        Returns what getattr(cipher, operation)(text, key) returns, from the cache if it can.
+        :param operation: Name of a cipher method that takes (text, key) and returns a string, eg. 'decrypt'
+        """
+        digest = result_digest(type(cipher).__name__, operation, key, (text,))
+        result = self.get(digest)
+        if result is None:
+            result = getattr(cipher, operation)(text, key)
+            self.put(digest, result)
+        return result
+
+    def clear(self):
+        """
+        Empties both tiers, deleting the files of the disk tier, and resets the counters.
+        """
+        with self.lock:
+            self.memory.clear()
+            self.memory_used = 0
+            self.load_disk()
+            self.disk_size, disk_size = 0, self.disk_size
+            self.evict_disk()
+            self.disk_size = disk_size
+            self.memory_hits = self.disk_hits = self.misses = self.chars_saved = 0
+
+    def info(self):
+        """
+        :return: Dictionary of the hit/miss counters, hit rate, characters saved (bytes, for ASCII results)
+                 and the size of each tier
+        """
+        with self.lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'bytes_saved': self.chars_saved,
+                'memory_entries': len(self.memory),
+                'memory_used': self.memory_used,
+                'disk_entries': len(self.disk) if self.disk is not None else 0,
+                'disk_used': self.disk_used,
+            }
+
+
+# Shared by every cipher instance
+RESULTS = ResultCache()
+
+if __name__ == "__main__":
+    from classical_ciphers import ViginereCipher
+
+    cache = ResultCache(disk_size=1 << 20, directory=os.path.join(tempfile.mkdtemp(), "results"))
+    for _ in range(3):
+        cache.run(ViginereCipher(), 'encrypt', "attack at dawn", "lemon")
+    print(cache.info())  # 2 hits, 1 miss
+    cache.clear()
@@ -0,0 +1,366 @@
+#
+# CS106 Final Project
+# CryptWing
+#
+# segments
+#
+# Shion Fukuzawa (sf27)
+# December 15, 2016
+#
+# This file finds where a text made of several messages, encrypted with different ciphers or keys, moves on
+# from one message to the next. A window of letters slides over the text in one streaming pass, keeping
+# only its letter counts, and every window is compared with the one right after it. Where the two stop
+# looking alike a new segment starts, and each segment can then be cracked on its own, so a file of any
+# size is split without ever being loaded whole.
+#
+# Usage:
+#   python3 segments.py messages.txt
+#   python3 segments.py --crack --window 4096 messages.txt
+#
+
+import argparse
+import math
+import sys
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from analyzer import ENGLISH_FREQUENCIES
+from cipher import CHUNK_SIZE
+from classical_ciphers import CaesarCipher, ViginereCipher
+from classifier import CipherClassifier
+from cracker import CaesarSolver, VigenereSolver, position_letters
+
+# Letters in a window, and letters the window moves by at a time. The window must be a whole number of steps.
+WINDOW_SIZE = 1 << 11
+STEP = 1 << 8
+
+# How many standard deviations two neighbouring windows must be from having the same letter frequencies
+# for the boundary between them to be a change point
+CHANGE_THRESHOLD = 10.0
+
+
+def window_ioc(counts, size):
+    """
+    :return: The index of coincidence of a window of [size] letters
+    """
+    return sum(n * (n - 1) for n in counts) / (size * (size - 1))
+
+
+def window_chi_squared(counts, size):
+    """
+    :return: The chi-squared statistic of the letter counts of a window against English. Lower is more
+             English-like.
+    """
+    score = 0.0
+    for n, frequency in zip(counts, ENGLISH_FREQUENCIES):
+        expected = size * frequency
+        score += (n - expected) ** 2 / expected
+    return score
+
+
+def change_score(left, right):
+    """
+    Two sample chi-squared test of whether two windows of the same size have the same letter frequencies.
+    :return: How many standard deviations the statistic is above what two windows of one text give. Around
+             0 (or below) when they match.
+    """
+    statistic = 0.0
+    letters = 0
+    for a, b in zip(left, right):
+        if a + b:
+            statistic += (a - b) ** 2 / (a + b)
+            letters += 1
+    freedom = letters - 1
+    if freedom < 1:
+        return 0.0
+    return (statistic - freedom) / math.sqrt(2 * freedom)
+
+
+class SlidingWindow:
+    """
+    Streaming letter statistics of a window of [window] letters, sliding over a text [step] letters at a
+    time. The text is fed in chunks of any size, and only the counts of the last few blocks of [step]
+    letters and windows are kept, so memory is O(window) whatever the length of the text.
+    Each time the window moves, the block of letters entering it is added to its rolling letter counts and
+    the block leaving it is taken off (with step 1, a letter at a time).
+    Every window is reported as (start, end, IoC, chi-squared against English), where [start, end) is its
+    range of characters in the whole text.
+    Change points: each window is compared with the window right after it (see change_score). A run of
+    boundaries where the two differ by more than the threshold gives one change point, at the boundary
+    where they differ most, reported as (offset, score). A change point is only confirmed about a window
+    after the text passes it, and none can be found within a window of either end of the text.
+        offset: Characters fed so far
+    """
+
+    def __init__(self, window=WINDOW_SIZE, step=STEP, threshold=CHANGE_THRESHOLD):
+        """
+        :param window: Letters in a window. Must be a whole number of steps, and at least 2.
+        :param step: Letters the window moves by at a time
+        :param threshold: Smallest change_score of a change point
+        """
+        if step < 1 or window < 2 or window % step:
+            raise ValueError("The window must be a whole number (at least 1) of steps, and at least 2 letters.")
+        self.window = window
+        self.step = step
+        self.threshold = threshold
+        self.blocks_per_window = window // step
+        self.offset = 0
+        self.partial = np.zeros(26, dtype=np.int64) if np is not None else [0] * 26
+        self.partial_letters = 0
+        self.blocks = deque()
+        self.boundaries = deque([0])
+        self.counts = [0] * 26
+        self.windows = deque()
+        self.run = None
+
+    def update(self, chunk):
+        """
+        :param chunk: The next part of the text
+        :return: (list of the windows the chunk completes, list of the change points it confirms)
+        """
+        blocks, ends = self.add_letters(chunk)
+        windows, counts = self.slide(blocks, ends)
+        return windows, self.compare(counts, [window[1] for window in windows])
+
+    def finish(self):
+        """
+        Ends the text.
+        :return: List of the change points still waiting to be confirmed
+        """
+        changes = []
+        if self.run is not None:
+            changes.append((self.run[1], self.run[0]))
+            self.run = None
+        return changes
+
+    def add_letters(self, chunk):
+        """
+        Counts the letters of the chunk in blocks of [step] letters. A block left unfinished at the end of
+        the chunk is finished by the next one.
+        :return: (letter counts of every finished block, character offset where each of them ends)
+        """
+        step = self.step
+        values = position_letters(chunk)
+        if np is not None:
+            where = np.flatnonzero(values < 26)
+            letters = values[where].astype(np.int64)
+            filled = self.partial_letters
+            total = filled + len(letters)
+            count = total // step
+            ids = (np.arange(len(letters), dtype=np.int64) + filled) // step
+            blocks = np.bincount(ids * 26 + letters, minlength=(count + 1) * 26).reshape(count + 1, 26)
+            blocks[0] += self.partial
+            self.partial = blocks[count].copy()
+            self.partial_letters = total - count * step
+            ends = (where[np.arange(1, count + 1) * step - filled - 1] + 1 + self.offset).tolist()
+            self.offset += len(chunk)
+            return blocks[:count], ends
+
+        counts = self.partial
+        filled = self.partial_letters
+        blocks = []
+        ends = []
+        for i, value in enumerate(values):
+            if value < 26:
+                counts[value] += 1
+                filled += 1
+                if filled == step:
+                    blocks.append(counts)
+                    ends.append(self.offset + i + 1)
+                    counts = [0] * 26
+                    filled = 0
+        self.partial = counts
+        self.partial_letters = filled
+        self.offset += len(chunk)
+        return blocks, ends
+
+    def slide(self, blocks, ends):
+        """
+        Moves the window over the new blocks.
+        :return: (list of the windows completed, letter counts of each of them)
+        """
+        per_window = self.blocks_per_window
+        size = self.window
+        if np is None:
+            windows = []
+            counts = []
+            for block, end in zip(blocks, ends):
+                self.blocks.append(block)
+                self.boundaries.append(end)
+                self.counts = [a + b for a, b in zip(self.counts, block)]
+                if len(self.blocks) > per_window:
+                    self.counts = [a - b for a, b in zip(self.counts, self.blocks.popleft())]
+                    self.boundaries.popleft()
+                if len(self.blocks) == per_window:
+                    windows.append((self.boundaries[0], end, window_ioc(self.counts, size),
+                                    window_chi_squared(self.counts, size)))
+                    counts.append(self.counts)
+            return windows, counts
+
+        # Here self.blocks only keeps the last per_window - 1 blocks, and self.boundaries the offset
+        # before each of them plus the end of the last one, so every window found is a new one
+        stacked = np.concatenate((np.array(self.blocks, dtype=np.int64).reshape(-1, 26), blocks))
+        bounds = list(self.boundaries) + ends
+        kept = per_window - 1
+        self.blocks = deque(stacked[max(len(stacked) - kept, 0):] if kept else ())
+        self.boundaries = deque(bounds[max(len(bounds) - kept - 1, 0):])
+        if len(stacked) < per_window:
+            return [], np.zeros((0, 26), dtype=np.int64)
+
+        # The counts of every window, as differences of running totals
+        totals = np.zeros((len(stacked) + 1, 26), dtype=np.int64)
+        np.cumsum(stacked, axis=0, out=totals[1:])
+        counts = totals[per_window:] - totals[:-per_window]
+
+        iocs = (counts * (counts - 1)).sum(axis=1) / (size * (size - 1))
+        expected = size * np.asarray(ENGLISH_FREQUENCIES)
+        chi_squared = ((counts - expected) ** 2 / expected).sum(axis=1)
+        windows = list(zip(bounds[:len(counts)], bounds[per_window:], iocs.tolist(), chi_squared.tolist()))
+        return windows, counts
+
+    def compare(self, counts, ends):
+        """
+        Scores the boundary at the end of each window that now has the window after it, and tracks the runs
+        of boundaries above the threshold.
+        :param counts: Letter counts of the new windows
+        :param ends: Where each of the new windows ends
+        :return: List of the change points confirmed
+        """
+        per_window = self.blocks_per_window
+        if np is None:
+            scores = []
+            offsets = []
+            for window_counts, end in zip(counts, ends):
+                self.windows.append((end, window_counts))
+                if len(self.windows) > per_window:
+                    offset, left = self.windows.popleft()
+                    scores.append(change_score(left, window_counts))
+                    offsets.append(offset)
+        else:
+            previous = [window_counts for _, window_counts in self.windows]
+            stacked = np.concatenate((np.array(previous, dtype=np.int64).reshape(-1, 26), counts))
+            bounds = [end for end, _ in self.windows] + ends
+            self.windows = deque(zip(bounds[-per_window:], stacked[-per_window:]))
+            left = stacked[:-per_window]
+            right = stacked[per_window:]
+            sums = left + right
+            statistics = np.where(sums > 0, (left - right) ** 2 / np.maximum(sums, 1), 0.0).sum(axis=1)
+            freedom = (sums > 0).sum(axis=1) - 1
+            scores = np.where(freedom > 0, (statistics - freedom) / np.sqrt(2 * np.maximum(freedom, 1)), 0.0)
+            scores = scores.tolist()
+            offsets = bounds[:len(scores)]
+
+        changes = []
+        for score, offset in zip(scores, offsets):
+            if score > self.threshold:
+                if self.run is None or score > self.run[0]:
+                    self.run = (score, offset)
+            elif self.run is not None:
+                changes.append((self.run[1], self.run[0]))
+                self.run = None
+        return changes
+
+
+def find_segments(chunks, window=WINDOW_SIZE, step=STEP, threshold=CHANGE_THRESHOLD):
+    """
+    Splits a text at its change points.
+    :param chunks: The text, as an iterable of strings
+    :return: Generator of the (start, end) character range of each segment, each yielded as soon as the
+             change point that ends it is confirmed
+    """
+    sliding = SlidingWindow(window, step, threshold)
+    start = 0
+    for chunk in chunks:
+        for offset, _ in sliding.update(chunk)[1]:
+            yield start, offset
+            start = offset
+    for offset, _ in sliding.finish():
+        yield start, offset
+        start = offset
+    yield start, sliding.offset
+
+
+def read_byte_chunks(path, chunk_size=CHUNK_SIZE):
+    """
+    Reads a file a chunk at a time, one character per byte, so that character offsets are file offsets and
+    a segment can be read back on its own with read_segment.
+    :return: Generator of strings of at most chunk_size characters
+    """
+    with open(path, 'rb') as tfile:
+        while True:
+            chunk = tfile.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk.decode('latin-1')
+
+
+def read_segment(path, start, end):
+    """
+    :return: Characters [start, end) of a file read by read_byte_chunks
+    """
+    with open(path, 'rb') as tfile:
+        tfile.seek(start)
+        return tfile.read(end - start).decode('latin-1')
+
+
+def crack_segment(text):
+    """
+    Guesses the cipher of a segment and breaks it if it is a caesar or Viginere cipher.
+    :return: (cipher class, confidence, key or None, decrypted text or None)
+    """
+    cipher, confidence = CipherClassifier().rank(text)[0]
+    if cipher is CaesarCipher:
+        return (cipher, confidence) + CaesarSolver().solve(text)
+    if cipher is ViginereCipher:
+        return (cipher, confidence) + VigenereSolver().solve(text)
+    return cipher, confidence, None, None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Split a file of messages encrypted with different ciphers or "
+                                                 "keys into segments, in one streaming pass.")
+    parser.add_argument("path", help="text file to split")
+    parser.add_argument("--window", type=int, default=WINDOW_SIZE,
+                        help="letters in each window (default %d)" % WINDOW_SIZE)
+    parser.add_argument("--step", type=int, default=STEP,
+                        help="letters the window moves by at a time (default %d)" % STEP)
+    parser.add_argument("--threshold", type=float, default=CHANGE_THRESHOLD,
+                        help="change point threshold, in standard deviations (default %g)" % CHANGE_THRESHOLD)
+    parser.add_argument("--windows", action="store_true", help="print the IoC and chi-squared of every window")
+    parser.add_argument("--crack", action="store_true", help="identify and break the cipher of every segment")
+    args = parser.parse_args(argv)
+
+    try:
+        sliding = SlidingWindow(args.window, args.step, args.threshold)
+    except ValueError as error:
+        parser.error(str(error))
+
+    changes = []
+    for chunk in read_byte_chunks(args.path):
+        windows, found = sliding.update(chunk)
+        changes += found
+        if args.windows:
+            for start, end, ioc, chi_squared in windows:
+                print("window %d-%d: IoC %.4f, chi-squared %.1f" % (start, end, ioc, chi_squared))
+    changes += sliding.finish()
+
+    bounds = [0] + [offset for offset, _ in changes] + [sliding.offset]
+    for (start, end), score in zip(zip(bounds, bounds[1:]), [None] + [score for _, score in changes]):
+        line = "segment %d-%d (%d characters)" % (start, end, end - start)
+        if score is not None:
+            line += ", change score %.1f" % score
+        if args.crack:
+            cipher, confidence, key, plain = crack_segment(read_segment(args.path, start, end))
+            line += ": %s %.2f" % (cipher.__name__, confidence)
+            if key is not None:
+                line += ", key %r: %s" % (key, " ".join(plain[:60].split()))
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,510 @@
+#
+# CS106 Final Project
+# CryptWing
+#
+# cipher service
+#
+# Shion Fukuzawa (sf27)
+# December 15, 2016
+#
+# This file runs the ciphers as a local service, so other programs can use them without the GUI. Requests
+# and responses are JSON objects, one per line, over TCP or a Unix socket. Requests that arrive together
+# for the same cipher and key are answered by a single encrypt_many/decrypt_many call, and large batches
+# are sent to a pool of worker processes so the service keeps accepting requests meanwhile.
+# Like cli.py, it must never import tkinter.
+#
+# Usage:
+#   python3 service.py serve --port 8765
+#   python3 service.py load --port 8765 --connections 8 --requests 5000 --cipher viginere --key mindblown
+#
+# Protocol:
+#   request:  {"id": 1, "op": "encrypt", "cipher": "viginere", "key": "mindblown", "text": "..."}
+#             op is encrypt, decrypt, analyze (no cipher or key needed) or stats (no text needed)
+#   response: {"id": 1, "result": ...} or {"id": 1, "error": "..."}
+#   A connection can send many requests without waiting; responses come back as they are ready, in any
+#   order, matched to their request by id.
+#
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import string
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from analyzer import Analyzer
+from classical_ciphers import CIPHER_NAMES
+from classifier import CipherClassifier
+from cracker import rank_shifts
+
+OPERATIONS = ('encrypt', 'decrypt', 'analyze')
+
+# Longest request line accepted, in bytes
+MAX_REQUEST_SIZE = 1 << 24
+
+# Requests waiting to be batched. When it is full, connections stop being read until there is room again.
+QUEUE_SIZE = 4096
+
+# Most requests answered by one batch
+MAX_BATCH = 512
+
+# Requests one connection can have waiting for an answer before it stops being read
+CONNECTION_WINDOW = 256
+
+# Batches with at least this many characters go to the process pool; smaller ones cost less to run than to
+# send to another process
+OFFLOAD_SIZE = 1 << 16
+
+# Most different messages each load test client makes
+MESSAGE_POOL = 64
+
+# The name each cipher class is given in responses
+CIPHER_CLASS_NAMES = {}
+for _name, _cipher in CIPHER_NAMES.items():
+    CIPHER_CLASS_NAMES.setdefault(_cipher, _name)
+
+
+def analyze_text(text):
+    """
+    :return: Dictionary of the statistics of the text, its most likely caesar key and its most likely ciphers
+    """
+    stats = Analyzer().analyze(text)
+    return {
+        'letters': stats.letters,
+        'non_letters': stats.non_letters,
+        'ioc': stats.index_of_coincidence(),
+        'caesar_key': rank_shifts(stats.unigrams)[0][0],
+        'ciphers': [[CIPHER_CLASS_NAMES[cipher], confidence] for cipher, confidence in CipherClassifier().rank(text)],
+    }
+
+
+def process_batch(operation, cipher_name, key, texts):
+    """
+    Answers a batch of requests that share their operation, cipher and key. Runs in the service, or in a
+    worker process.
+    :return: List of results, one per text
+    """
+    if operation == 'analyze':
+        return [analyze_text(text) for text in texts]
+    cipher = CIPHER_NAMES[cipher_name]()
+    if operation == 'encrypt':
+        return cipher.encrypt_many(texts, key)
+    return cipher.decrypt_many(texts, key)
+
+
+def percentile(values, fraction):
+    """
+    :param values: Sorted list of numbers
+    :return: The value below which [fraction] of the values fall (nearest rank)
+    """
+    if not values:
+        return 0.0
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+class Request:
+    """
+    A parsed request, waiting in the queue for its result.
+    """
+
+    def __init__(self, request_id, operation, cipher_name, key, text, future):
+        self.id = request_id
+        self.operation = operation
+        self.cipher_name = cipher_name
+        self.key = key
+        self.text = text
+        self.future = future
+
+    def group(self):
+        """
+        :return: What the requests of one batch call must share
+        """
+        if self.operation == 'analyze':
+            return self.operation, None, None
+        return self.operation, self.cipher_name, (type(self.key).__name__, self.key)
+
+
+class CipherService:
+    """
+    The service. Every connection feeds one bounded queue; a single batcher takes everything that is queued
+    at once, splits it into groups of the same operation, cipher and key, and runs each group as one call.
+    Backpressure comes from three bounds: the queue, the requests each connection may have in flight, and
+    the batches that may run at once.
+    """
+
+    def __init__(self, workers=None, queue_size=QUEUE_SIZE, max_batch=MAX_BATCH,
+                 connection_window=CONNECTION_WINDOW, offload_size=OFFLOAD_SIZE, batch_window=0.0):
+        """
+        :param workers: Worker processes for large batches. None for one per CPU, 0 to run everything in
+                        the service process.
+        :param batch_window: Seconds to wait for more requests after the first one of a batch. 0 only takes
+                             what has already arrived, so a lone request is never delayed.
+        """
+        self.workers = os.cpu_count() if workers is None else workers
+        self.queue_size = queue_size
+        self.max_batch = max_batch
+        self.connection_window = connection_window
+        self.offload_size = offload_size
+        self.batch_window = batch_window
+        self.queue = None
+        self.slots = None
+        self.pool = None
+        self.tasks = set()
+        self.requests = 0
+        self.batches = 0
+        self.offloaded = 0
+
+    def start(self):
+        """
+        Creates the queue, the pool and the batcher. Must be called from the event loop.
+        """
+        self.queue = asyncio.Queue(self.queue_size)
+        self.slots = asyncio.Semaphore(max(self.workers, 1) * 2)
+        if self.workers > 0:
+            self.pool = ProcessPoolExecutor(self.workers)
+        self.spawn(self.batch_loop())
+
+    def close(self):
+        for task in list(self.tasks):
+            task.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def spawn(self, coroutine):
+        """
+        Runs a coroutine in the background, keeping a reference to it until it is done.
+        """
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def serve_tcp(self, host, port):
+        """
+        :return: The asyncio server, listening on host:port
+        """
+        self.start()
+        return await asyncio.start_server(self.handle, host, port, limit=MAX_REQUEST_SIZE)
+
+    async def serve_unix(self, path):
+        """
+        :return: The asyncio server, listening on the Unix socket at path
+        """
+        self.start()
+        return await asyncio.start_unix_server(self.handle, path, limit=MAX_REQUEST_SIZE)
+
+    def stats(self):
+        """
+        :return: Dictionary of the requests answered, batches run, batches sent to the pool and the mean
+                 batch size
+        """
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'offloaded': self.offloaded,
+            'mean_batch': self.requests / self.batches if self.batches else 0.0,
+            'queued': self.queue.qsize() if self.queue is not None else 0,
+        }
+
+    def parse(self, line):
+        """
+        :return: The Request of one line, or None for a stats request. A malformed request raises ValueError
+                 carrying (its id if it had one, the message).
+        """
+        try:
+            message = json.loads(line)
+        except ValueError:
+            raise ValueError(None, "Request is not valid JSON")
+        if not isinstance(message, dict):
+            raise ValueError(None, "Request must be a JSON object")
+
+        request_id = message.get('id')
+        operation = message.get('op')
+        cipher_name = message.get('cipher')
+        key = message.get('key')
+        text = message.get('text')
+        if operation == 'stats':
+            return None
+        if operation not in OPERATIONS:
+            raise ValueError(request_id, "op must be one of %s, or stats" % ", ".join(OPERATIONS))
+        if operation != 'analyze' and cipher_name not in CIPHER_NAMES:
+            raise ValueError(request_id, "cipher must be one of %s" % ", ".join(sorted(CIPHER_NAMES)))
+        if not isinstance(text, str):
+            raise ValueError(request_id, "text must be a string")
+        if key is not None and not isinstance(key, (str, int)):
+            raise ValueError(request_id, "key must be a string or an integer")
+        return Request(request_id, operation, cipher_name, key, text, asyncio.get_running_loop().create_future())
+
+    async def handle(self, reader, writer):
+        """
+        Serves one connection until it closes.
+        """
+        window = asyncio.Semaphore(self.connection_window)
+        write_lock = asyncio.Lock()
+        pending = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    await self.send(writer, write_lock, {'id': None, 'error': "Request is too large"})
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+
+                await window.acquire()
+                try:
+                    request = self.parse(line)
+                except ValueError as error:
+                    request_id, message = error.args
+                    await self.send(writer, write_lock, {'id': request_id, 'error': message})
+                    window.release()
+                    continue
+                if request is None:
+                    await self.send(writer, write_lock, {'id': json.loads(line).get('id'), 'result': self.stats()})
+                    window.release()
+                    continue
+
+                await self.queue.put(request)  # Waits here while the queue is full
+                task = asyncio.ensure_future(self.respond(request, writer, write_lock, window))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            for task in pending:
+                task.cancel()
+            writer.close()
+
+    async def respond(self, request, writer, write_lock, window):
+        try:
+            try:
+                response = {'id': request.id, 'result': await request.future}
+            except Exception as error:
+                response = {'id': request.id, 'error': str(error)}
+            await self.send(writer, write_lock, response)
+        finally:
+            window.release()
+
+    async def send(self, writer, write_lock, response):
+        async with write_lock:
+            writer.write(json.dumps(response).encode('utf-8') + b"\n")
+            await writer.drain()
+
+    async def batch_loop(self):
+        """
+        Takes everything queued at once, up to max_batch requests, and runs it as one batch per group.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            # Let the connections that are ready queue their requests too
+            await asyncio.sleep(0)
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.group(), []).append(request)
+            for group in groups.values():
+                await self.slots.acquire()  # Waits here while enough batches are running
+                self.spawn(self.run_group(group))
+
+    async def run_group(self, group):
+        """
+        Runs one group as a single call, in the pool if it is large, and hands each request its result.
+        """
+        try:
+            first = group[0]
+            texts = [request.text for request in group]
+            arguments = (first.operation, first.cipher_name, first.key, texts)
+            if self.pool is not None and sum(map(len, texts)) >= self.offload_size:
+                self.offloaded += 1
+                results = await asyncio.get_running_loop().run_in_executor(self.pool, process_batch, *arguments)
+            else:
+                results = process_batch(*arguments)
+            for request, result in zip(group, results):
+                if not request.future.done():
+                    request.future.set_result(result)
+        except Exception as error:
+            for request in group:
+                if not request.future.done():
+                    request.future.set_exception(error)
+        finally:
+            self.requests += len(group)
+            self.batches += 1
+            self.slots.release()
+
+
+async def open_service(host=None, port=None, unix=None):
+    """
+    :return: (reader, writer) connected to the service
+    """
+    if unix is not None:
+        return await asyncio.open_unix_connection(unix, limit=MAX_REQUEST_SIZE)
+    return await asyncio.open_connection(host, port, limit=MAX_REQUEST_SIZE)
+
+
+def make_message(rng, size):
+    """
+    :return: A random text of [size] letters, spaces and punctuation
+    """
+    return "".join(rng.choices(string.ascii_letters + "     .,!?", k=size))
+
+
+def make_requests(count, operation, cipher_name, keys, size, seed):
+    """
+    Builds the requests of one client ahead of time, so that making them is not timed as part of the
+    service. At most MESSAGE_POOL different messages are made; the requests take turns using them.
+    :return: List of [count] encoded request bodies, each missing only its opening '{"id": n, '
+    """
+    rng = random.Random(seed)
+    bodies = []
+    for _ in range(min(count, MESSAGE_POOL)):
+        request = {'op': operation, 'cipher': cipher_name, 'key': rng.choice(keys), 'text': make_message(rng, size)}
+        bodies.append(json.dumps(request)[1:].encode('utf-8') + b"\n")
+    return [bodies[i % len(bodies)] for i in range(count)]
+
+
+async def load_connection(address, bodies, window, latencies):
+    """
+    Sends the requests over one connection, keeping up to [window] of them waiting for an answer, and
+    records the latency of each.
+    :param bodies: Requests made by make_requests
+    :return: Number of error responses
+    """
+    requests = len(bodies)
+    reader, writer = await open_service(**address)
+    slots = asyncio.Semaphore(window)
+    sent = {}
+    errors = 0
+
+    async def receive():
+        nonlocal errors
+        for _ in range(requests):
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - sent.pop(response['id']))
+            if 'error' in response:
+                errors += 1
+            slots.release()
+
+    receiver = asyncio.ensure_future(receive())
+    for request_id, body in enumerate(bodies):
+        await slots.acquire()
+        sent[request_id] = time.perf_counter()
+        writer.write(b'{"id": %d, ' % request_id + body)
+        await writer.drain()
+    await receiver
+    writer.close()
+    return errors
+
+
+async def load_test(address, connections=8, requests=1000, window=32, operation='encrypt',
+                    cipher_name='viginere', keys=("mindblown",), size=64, seed=0):
+    """
+    Runs [connections] clients at once against the service. Every request is made before the clock starts.
+    :param address: Dictionary of host and port, or of unix, as taken by open_service
+    :return: Dictionary of requests, errors, seconds, requests per second, and p50/p99 latency in ms
+    """
+    clients = [make_requests(requests, operation, cipher_name, keys, size, seed + i) for i in range(connections)]
+    latencies = []
+    start = time.perf_counter()
+    errors = await asyncio.gather(*(load_connection(address, bodies, window, latencies) for bodies in clients))
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'seconds': seconds,
+        'rps': len(latencies) / seconds if seconds else 0.0,
+        'p50_ms': 1000 * percentile(latencies, 0.50),
+        'p99_ms': 1000 * percentile(latencies, 0.99),
+    }
+
+
+async def fetch_stats(address):
+    """
+    :return: The service's own counters (see CipherService.stats)
+    """
+    reader, writer = await open_service(**address)
+    writer.write(b'{"id": 0, "op": "stats"}\n')
+    await writer.drain()
+    response = json.loads(await reader.readline())
+    writer.close()
+    return response['result']
+
+
+async def serve(address, workers):
+    service = CipherService(workers)
+    if address['unix'] is not None:
+        server = await service.serve_unix(address['unix'])
+    else:
+        server = await service.serve_tcp(address['host'], address['port'])
+    print("Serving on %s" % ", ".join(str(sock.getsockname()) for sock in server.sockets), flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the CryptWing ciphers as a local service, or load test one.")
+    parser.add_argument("command", choices=("serve", "load"), help="run the service, or the load generator")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host (default %(default)s)")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port (default %(default)s)")
+    parser.add_argument("--unix", help="Unix socket path, instead of TCP")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="serve: worker processes for large batches (default one per CPU, 0 for none)")
+    parser.add_argument("--connections", type=int, default=8, help="load: clients at once (default %(default)s)")
+    parser.add_argument("--requests", type=int, default=1000,
+                        help="load: requests per client (default %(default)s)")
+    parser.add_argument("--window", type=int, default=32,
+                        help="load: requests each client keeps waiting for an answer (default %(default)s)")
+    parser.add_argument("--op", default="encrypt", choices=OPERATIONS, help="load: operation (default %(default)s)")
+    parser.add_argument("--cipher", default="viginere", choices=sorted(CIPHER_NAMES),
+                        help="load: cipher (default %(default)s)")
+    parser.add_argument("-k", "--key", action="append",
+                        help="load: key, repeatable to spread requests over several keys (default mindblown)")
+    parser.add_argument("--size", type=int, default=64, help="load: characters per message (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    address = {'host': args.host, 'port': args.port, 'unix': args.unix}
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(address, args.workers))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    result = asyncio.run(load_test(address, args.connections, args.requests, args.window, args.op, args.cipher,
+                                   tuple(args.key or ("mindblown",)), args.size))
+    print("%d requests (%d errors) in %.2f s: %.0f requests/s, p50 %.2f ms, p99 %.2f ms"
+          % (result['requests'], result['errors'], result['seconds'], result['rps'], result['p50_ms'],
+             result['p99_ms']))
+    stats = asyncio.run(fetch_stats(address))
+    print("Service: %d requests in %d batches (mean %.1f per batch), %d sent to the pool"
+          % (stats['requests'], stats['batches'], stats['mean_batch'], stats['offloaded']))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())